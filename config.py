@@ -1,5 +1,6 @@
 import os
 from supabase import create_client, Client
+from supabase.lib.client_options import SyncClientOptions
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,6 +9,9 @@ load_dotenv()
 # Environment variables
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 GROUP_CHAT_ID = int(os.environ.get("GROUP_CHAT_ID_EU", "0"))
+# Optional JSON list of extra groups ({"chat_id", "channel_username", "admin_user_id", "title", "about", "topics"})
+# served by the same bot
+GROUPS_CONFIG_FILE = os.environ.get("GROUPS_CONFIG_FILE", "groups.json")
 
 # GROUP_CHAT_ID = int(os.environ.get("GROUP_CHAT_ID", "0"))
 # BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN_SIMPLELEARNINGUZ")
@@ -36,7 +40,97 @@ OTHER_COMMENT_POINTS = 10
 
 POINTS_FOR_REFERRAL = 5  # Points for successful referral
 POINTS_FOR_JOINING = 3    # Points for joining via referral
+
+# Declarative scoring rules, compiled once at startup by utils/scoring.py.
+# Each activity type has a list of age tiers checked in order: a tier applies
+# while the post is younger than max_age_hours (None = no limit, must be last).
+# "positions" gives the points for the 1st, 2nd, ... comment on a post and
+# "points" is the default. Add more tiers for a multi-step decay.
+SCORING_RULES = {
+    'comment': [
+        {'max_age_hours': None, 'positions': [FIRST_COMMENT_POINTS, SECOND_COMMENT_POINTS, THIRD_COMMENT_POINTS], 'points': OTHER_COMMENT_POINTS},
+    ],
+    'reaction': [
+        {'max_age_hours': EARLY_WINDOW_HOURS, 'points': POINTS_FOR_REACTION_EARLY},
+        {'max_age_hours': None, 'points': POINTS_FOR_REACTION_LATE},
+    ],
+    'referral': [{'max_age_hours': None, 'points': POINTS_FOR_REFERRAL}],
+    'joining': [{'max_age_hours': None, 'points': POINTS_FOR_JOINING}],
+}
+# Optional JSON file overriding SCORING_RULES per activity type, so point values can change without code edits
+SCORING_RULES_FILE = os.environ.get("SCORING_RULES_FILE", "scoring_rules.json")
 CHANNEL_USERNAME = "uzbek_europe" 
 
+# Warm restart snapshot of the in-memory event store
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "event_store.snapshot")
+SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get("SNAPSHOT_INTERVAL_SECONDS", "300"))
+
+# Scoring worker processes (0 = score inside the bot process). Events are routed by post.
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "0"))
+
+# Idempotent ingestion: processed update keys are remembered for this long, journaled to disk as they are seen
+DEDUP_PATH = os.environ.get("DEDUP_PATH", "processed_updates.jsonl")
+DEDUP_TTL_SECONDS = int(os.environ.get("DEDUP_TTL_SECONDS", str(48 * 3600)))
+DEDUP_MAX_KEYS = int(os.environ.get("DEDUP_MAX_KEYS", "200000"))
+DEDUP_FSYNC_BATCH = int(os.environ.get("DEDUP_FSYNC_BATCH", "50"))
+DEDUP_FSYNC_SECONDS = float(os.environ.get("DEDUP_FSYNC_SECONDS", "1.0"))
+
+# Referrals waiting for the invited user to join the channel: expiry, size bound, and whether to keep them in Supabase
+PENDING_REFERRAL_TTL_SECONDS = int(os.environ.get("PENDING_REFERRAL_TTL_SECONDS", str(3 * 24 * 3600)))
+PENDING_REFERRAL_MAX = int(os.environ.get("PENDING_REFERRAL_MAX", "50000"))
+PENDING_REFERRAL_PERSIST = os.environ.get("PENDING_REFERRAL_PERSIST", "false").lower() in ("1", "true", "yes")
+
+# Storage circuit breaker and local spool used while Supabase is slow or down
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_SECONDS = int(os.environ.get("BREAKER_RESET_SECONDS", "30"))
+# Per-call timeout for Supabase requests; a timed-out call counts as a failure for the breaker
+STORAGE_TIMEOUT_SECONDS = float(os.environ.get("STORAGE_TIMEOUT_SECONDS", "5"))
+SPOOL_PATH = os.environ.get("SPOOL_PATH", "activity_spool.jsonl")
+SPOOL_FSYNC_BATCH = int(os.environ.get("SPOOL_FSYNC_BATCH", "20"))
+SPOOL_FSYNC_SECONDS = float(os.environ.get("SPOOL_FSYNC_SECONDS", "1.0"))
+SPOOL_REPLAY_INTERVAL_SECONDS = int(os.environ.get("SPOOL_REPLAY_INTERVAL_SECONDS", "15"))
+
+# Award throttling: per-user token bucket (rate, burst), max awards per user per post, idle state eviction
+AWARD_RATE_PER_MINUTE = float(os.environ.get("AWARD_RATE_PER_MINUTE", "20"))
+AWARD_BURST = int(os.environ.get("AWARD_BURST", "10"))
+AWARD_POST_CAP = int(os.environ.get("AWARD_POST_CAP", "3"))
+AWARD_IDLE_SECONDS = int(os.environ.get("AWARD_IDLE_SECONDS", "600"))
+
+# Paginated leaderboard: users per page, and which ranking snapshots stay browsable: the newest
+# RANKING_SNAPSHOTS_PER_CHAT of each chat, plus older ones paged within RANKING_SNAPSHOT_IDLE_SECONDS,
+# none older than RANKING_SNAPSHOT_TTL_SECONDS
+LEADERBOARD_PAGE_SIZE = int(os.environ.get("LEADERBOARD_PAGE_SIZE", "20"))
+RANKING_SNAPSHOTS_PER_CHAT = int(os.environ.get("RANKING_SNAPSHOTS_PER_CHAT", "2"))
+RANKING_SNAPSHOT_IDLE_SECONDS = int(os.environ.get("RANKING_SNAPSHOT_IDLE_SECONDS", "600"))
+RANKING_SNAPSHOT_TTL_SECONDS = int(os.environ.get("RANKING_SNAPSHOT_TTL_SECONDS", "3600"))
+
+# Rankings are precomputed off the request path every RANKING_REFRESH_SECONDS.
+# LEADERBOARD_DIGEST: "off", "daily" or "weekly" top list posted to GROUP_CHAT_ID at LEADERBOARD_DIGEST_TIME (UTC, HH:MM)
+RANKING_REFRESH_SECONDS = int(os.environ.get("RANKING_REFRESH_SECONDS", "300"))
+LEADERBOARD_DIGEST = os.environ.get("LEADERBOARD_DIGEST", "off")
+LEADERBOARD_DIGEST_TIME = os.environ.get("LEADERBOARD_DIGEST_TIME", "09:00")
+LEADERBOARD_DIGEST_SIZE = int(os.environ.get("LEADERBOARD_DIGEST_SIZE", "10"))
+
+# Resolving missing display names on Telegram: parallel calls, per-call timeout, cache lifetime (misses kept shorter)
+NAME_RESOLVE_CONCURRENCY = int(os.environ.get("NAME_RESOLVE_CONCURRENCY", "8"))
+NAME_RESOLVE_TIMEOUT = float(os.environ.get("NAME_RESOLVE_TIMEOUT", "3.0"))
+NAME_CACHE_TTL_SECONDS = int(os.environ.get("NAME_CACHE_TTL_SECONDS", str(24 * 3600)))
+NAME_NEGATIVE_TTL_SECONDS = int(os.environ.get("NAME_NEGATIVE_TTL_SECONDS", "3600"))
+NAME_CACHE_MAX = int(os.environ.get("NAME_CACHE_MAX", "10000"))
+
+# Contests: size of the top list the winner is drawn from, and the audit log of draws
+CONTEST_TOP_K = int(os.environ.get("CONTEST_TOP_K", "10"))
+CONTEST_DRAW_LOG = os.environ.get("CONTEST_DRAW_LOG", "contest_draws.jsonl")
+
+# Storage backend: "supabase", or "memory" for an in-process stand-in (load testing)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "supabase")
+
 # Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
\ No newline at end of file
+if STORAGE_BACKEND == "memory":
+    from utils.memory_storage import MemoryClient
+    supabase = MemoryClient()
+else:
+    supabase: Client = create_client(
+        SUPABASE_URL, SUPABASE_KEY,
+        options=SyncClientOptions(postgrest_client_timeout=STORAGE_TIMEOUT_SECONDS)
+    )
\ No newline at end of file
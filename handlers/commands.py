@@ -1,5 +1,8 @@
+import asyncio
 import logging
-import random
+import os
+import shutil
+import tempfile
 from datetime import datetime, timezone
 from telegram import Update, constants
 from telegram.ext import ContextTypes
@@ -9,19 +12,47 @@ from datetime import timedelta
 from config import (
     supabase, 
     ADMIN_USER_ID_EU,
-    POINTS_FOR_COMMENT_EARLY,
-    POINTS_FOR_COMMENT_LATE,
-    POINTS_FOR_REACTION_EARLY,
-    POINTS_FOR_REACTION_LATE,
     GROUP_CHAT_ID,
-    POINTS_FOR_REFERRAL,
-    POINTS_FOR_JOINING,
-    CHANNEL_USERNAME
+    SNAPSHOT_PATH,
+    LEADERBOARD_PAGE_SIZE
 )
-from utils.helpers import get_leaderboard, log_activity
+from utils.helpers import log_activity
+from utils.event_store import event_stores, get_event_store
+from utils.groups import get_group, group_or_default, is_group_admin, resolve_chat_id, load_groups
+from utils.snapshot import save_snapshot
+from utils.scoring import scoring_rules
+from utils.rescoring import rescore, format_report
+from utils.ranking import LEADERBOARD_WINDOWS, latest_snapshot, get_snapshot, latest as ranking_latest
+from utils.contest import take_contest_snapshot, get_contest, draw_winner, record_draw
+from utils.referrals import pending_referrals
+from utils.workers import worker_pool
+from utils.seasons import archive_season, hall_of_fame
+from utils.export import EXPORT_TABLES, EXPORT_FORMATS, export_table, export_leaderboard
 
 logger = logging.getLogger(__name__)
 
+# Referral rewards come from the compiled scoring rules
+POINTS_FOR_REFERRAL = scoring_rules.points('referral')
+POINTS_FOR_JOINING = scoring_rules.points('joining')
+
+
+def format_rule_lines(activity_type: str) -> str:
+    """Scoring rule lines for a type as an escaped MarkdownV2 bullet list"""
+    return "".join(f"  • {escape_markdown(line, version=2)}\n" for line in scoring_rules.describe(activity_type))
+
+
+def group_title(chat_id: int) -> str:
+    """A group's title, escaped for MarkdownV2"""
+    return escape_markdown(group_or_default(chat_id)['title'], version=2)
+
+
+def group_about(chat_id: int, bullet: str) -> str:
+    """A group's channel pitch and topics as an escaped MarkdownV2 paragraph, empty if it has none"""
+    group = group_or_default(chat_id)
+    text = f"{escape_markdown(group['about'], version=2)}:\n" if group.get('about') else ""
+    text += "".join(f"{bullet} {escape_markdown(topic, version=2)}\n" for topic in group.get('topics', ()))
+    return f"{text}\n" if text else ""
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command - welcome message and referral tracking"""
     user_id = update.message.from_user.id
@@ -37,14 +68,15 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Handle referral
     if referral_payload:
-        from utils.helpers import get_referrer_from_payload, has_user_joined_before, log_referral, check_channel_membership
+        from utils.helpers import get_referrer_from_payload, get_referral_chat_from_payload, has_user_joined_before, log_referral, check_channel_membership
         from telegram import InlineKeyboardButton, InlineKeyboardMarkup
         
         referrer_id = get_referrer_from_payload(referral_payload)
+        chat_id = get_referral_chat_from_payload(referral_payload)
         
         if referrer_id and referrer_id != user_id:
             # Check if user already joined before
-            if has_user_joined_before(user_id):
+            if has_user_joined_before(user_id, chat_id):
                 await update.message.reply_text(
                     "👋 Xush kelibsiz\\!\n\n"
                     "Siz allaqachon botga qo'shilgansiz va ballaringiz hisobga olingan\\.\n\n"
@@ -55,19 +87,19 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return  
             
             # Check channel membership
-            is_member = await check_channel_membership(user_id, context)
+            is_member = await check_channel_membership(user_id, context, chat_id)
             
             if is_member:
                 # Award points immediately
-                log_referral(referrer_id, user_id, username, first_name)
-                log_activity(referrer_id, None, None, 'referral', POINTS_FOR_REFERRAL, post_id=user_id)
-                log_activity(user_id, username, first_name, 'joining', POINTS_FOR_JOINING)
+                log_referral(referrer_id, user_id, username, first_name, chat_id)
+                log_activity(referrer_id, None, None, 'referral', POINTS_FOR_REFERRAL, post_id=user_id, chat_id=chat_id)
+                log_activity(user_id, username, first_name, 'joining', POINTS_FOR_JOINING, chat_id=chat_id)
                 
                 welcome_text = (
                     f"🎉 *Xush kelibsiz, {escape_markdown(first_name, version=2)}\\!*\n\n"
                     f"✅ Siz *{POINTS_FOR_JOINING} ball* oldingiz\\!\n"
                     f"🎁 Sizni taklif qilgan foydalanuvchi *{POINTS_FOR_REFERRAL} ball* oldi\\!\n\n"
-                    f"🇩🇪 *Yevropalik o'zbek* jamoasiga xush kelibsiz\\!\n\n"
+                    f"*{group_title(chat_id)}* jamoasiga xush kelibsiz\\!\n\n"
                     f"📌 *Nima qilishingiz mumkin:*\n"
                     f"• Guruhdagi postlarga izoh qoldiring\n"
                     f"• Postlarga reaction bering\n"
@@ -95,28 +127,19 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 
                 return  
             else:
-                context.user_data['pending_referral'] = {
-                    'referrer_id': referrer_id,
-                    'user_id': user_id,
-                    'username': username,
-                    'first_name': first_name
-                }
+                pending_referrals.put(user_id, referrer_id, chat_id)
                 
                 # Create inline keyboard with channel link and check button
                 keyboard = [
-                    [InlineKeyboardButton("📢 Kanalga qo'shilish", url=f"https://t.me/{CHANNEL_USERNAME}")],
+                    [InlineKeyboardButton("📢 Kanalga qo'shilish", url=f"https://t.me/{get_group(chat_id)['channel_username']}")],
                     [InlineKeyboardButton("✅ Obunani tekshirish", callback_data="check_subscription_referral")]
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
                 join_message = (
                     f"📢 *Botdan foydalanish uchun kanalga qo'shiling\\!*\n\n"
-                    f"🇩🇪 *Yevropalik o'zbek* \\- Germaniyaga kelganlar va kelmoqchi bo'lganlar uchun:\n\n"
-                    f"✅ O'qish va grant imkoniyatlari\n"
-                    f"✅ Ish topish yo'llari\n"
-                    f"✅ Immigratsiya masalalari\n"
-                    f"✅ Hayot haqida foydali ma'lumotlar\n"
-                    f"✅ Hammasi oddiy va tushunarli tilda\\!\n\n"
+                    f"*{group_title(chat_id)}*\n"
+                    f"{group_about(chat_id, '✅')}"
                     f"👇 Quyidagi tugmani bosing va kanalga qo'shiling, keyin obunani tekshiring\\!\n\n"
                     f"Qo'shilganingizdan keyin *{POINTS_FOR_JOINING} ball* olasiz\\!"
                 )
@@ -139,19 +162,23 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "🎉 *Welcome, Admin!*\n\n"
             "This bot tracks group activity and awards points:\n\n"
             f"📝 *Comment Points:*\n"
-            f"  • First 48h: {POINTS_FOR_COMMENT_EARLY} points\n"
-            f"  • After 48h: {POINTS_FOR_COMMENT_LATE} points\n\n"
+            f"{format_rule_lines('comment')}\n"
             f"❤️ *Reaction Points:*\n"
-            f"  • First 48h: {POINTS_FOR_REACTION_EARLY} points\n"
-            f"  • After 48h: {POINTS_FOR_REACTION_LATE} points\n\n"
+            f"{format_rule_lines('reaction')}\n"
             f"🔗 *Referral Points:*\n"
             f"  • Per referral: {POINTS_FOR_REFERRAL} points\n"
             f"  • New user bonus: {POINTS_FOR_JOINING} points\n\n"
             "🛠️ *Admin Commands:*\n"
             "/leaderboard \\- View all rankings\n"
-            "/contest \\- Post leaderboard for contest\n"
-            "/pickwinner \\- Pick random winner from top 10\n"
+            "/contest \\[weighted\\] \\- Post leaderboard for contest, committing to the draw seed\n"
+            "/pickwinner \\- Draw from the contest top list with the committed seed\n"
             "/resettop \\- Archive and reset scores\n"
+            "/rescore \\- Recompute points under current rules\n"
+            "/reloadgroups \\- Reload per\\-group settings\n"
+            "/export \\- Export activity, referrals or leaderboards\n"
+            "/poststats \\- Engagement for one post\n"
+            "/topposts \\- Most engaging posts this week\n"
+            "/halloffame \\- All\\-seasons standings and champions\n"
             "/referral \\- Your referral link\n\n"
             "✅ Bot is active and monitoring!"
         )
@@ -159,14 +186,15 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"👤 Regular user - showing regular welcome")
         welcome_msg = (
             f"👋 Salom, {escape_markdown(first_name, version=2)}\\!\n\n"
-            f"🇩🇪 *Yevropalik o'zbek* guruhi faollik botiga xush kelibsiz\\!\n\n"
+            f"*{group_title(resolve_chat_id(update))}* guruhi faollik botiga xush kelibsiz\\!\n\n"
             f"📊 *Ballar qanday ishlab topiladi:*\n"
-            f"• 💬 Postlarga izoh \\(10/3 ball\\)\n"
-            f"• ❤️ Postlarga reaction \\(3/1 ball\\)\n"
+            f"• 💬 Postlarga izoh \\({scoring_rules.summary('comment')} ball\\)\n"
+            f"• ❤️ Postlarga reaction \\({scoring_rules.summary('reaction')} ball\\)\n"
             f"• 👥 Do'stlarni taklif qilish \\({POINTS_FOR_REFERRAL} ball\\)\n\n"
             f"💡 *Birinchi 48 soatda faol bo'ling* \\- ko'proq ball\\!\n\n"
             f"🎁 *Foydali buyruqlar:*\n"
             f"/leaderboard \\- Reytingni ko'rish\n"
+            f"/halloffame \\- Barcha mavsumlar reytingi\n"
             f"/referral \\- Do'stlarni taklif qilish\n\n"
             f"🏆 Faol bo'ling va sovg'alar yutib oling\\!"
         )
@@ -186,13 +214,14 @@ async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     from utils.helpers import generate_referral_link
 
+    chat_id = resolve_chat_id(update, context.args)
     
     # Generate referral link
-    referral_link = generate_referral_link(user_id, bot_username)
+    referral_link = generate_referral_link(user_id, bot_username, chat_id)
     
     # Get referral count
     try:
-        result = supabase.table('referrals').select('id').eq('referrer_id', user_id).execute()
+        result = supabase.table('referrals').select('id').eq('chat_id', chat_id).eq('referrer_id', user_id).execute()
         referral_count = len(result.data)
     except:
         referral_count = 0
@@ -201,19 +230,14 @@ async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     message = (
         f"🎁 *DO'STLARINGIZNI TAKLIF QILING\\!*\n\n"
-        f"🇩🇪 *Yevropalik o'zbek* jamoasiga qo'shiling va ballar yutib oling\\!\n\n"
-        f"Germaniyaga kelganlar va kelmoqchi bo'lganlar uchun foydali kanalimizda:\n"
-        f"• 📚 O'qish va grant imkoniyatlari\n"
-        f"• 💼 Ish topish yo'llari\n"
-        f"• 🛂 Immigratsiya masalalari\n"
-        f"• 🏡 Hayot haqida foydali ma'lumotlar\n"
-        f"• 🗣️ Hammasi oddiy va tushunarli tilda\\!\n\n"
+        f"*{group_title(chat_id)}* jamoasiga qo'shiling va ballar yutib oling\\!\n\n"
+        f"{group_about(chat_id, '•')}"
         f"━━━━━━━━━━━━━━━━━━━━\n\n"
         f"🔗 *Sizning referal havolangiz:*\n"
         f"`{referral_link}`\n\n"
         f"📋 *Qanday ishlaydi?*\n"
         f"1️⃣ Havolani do'stlaringizga yuboring\n"
-        f"2️⃣ Ular @uzbek\\_europe kanaliga qo'shiladi\n"
+        f"2️⃣ Ular @{escape_markdown(group_or_default(chat_id)['channel_username'], version=2)} kanaliga qo'shiladi\n"
         f"3️⃣ Botni ishga tushiradi\n"
         f"4️⃣ Ikkalovingiz ham ball olasiz\\!\n\n"
         f"💰 *Mukofotlar:*\n"
@@ -240,9 +264,13 @@ async def check_subscription_callback(update: Update, context: ContextTypes.DEFA
     
     logger.info(f"🔔 Subscription check callback from user {user_id}")
     
+    pending_referral = pending_referrals.get(user_id)
+    chat_id = pending_referral.get('chat_id', GROUP_CHAT_ID) if pending_referral else GROUP_CHAT_ID
+    
     # Check if user already joined/got points before
-    if has_user_joined_before(user_id):
+    if has_user_joined_before(user_id, chat_id):
         logger.info(f"⚠️ User {user_id} already joined before, no points awarded")
+        pending_referrals.pop(user_id)
         await query.edit_message_text(
             "👋 Xush kelibsiz qaytib\\!\n\n"
             "Siz allaqachon botga qo'shilgansiz va ballaringiz hisobga olingan\\.\n\n"
@@ -253,36 +281,33 @@ async def check_subscription_callback(update: Update, context: ContextTypes.DEFA
         return
     
     # Check if user is now subscribed
-    is_member = await check_channel_membership(user_id, context)
+    is_member = await check_channel_membership(user_id, context, chat_id)
     
     if is_member:
         logger.info(f"✅ User {user_id} is now a member")
         
-        # Get pending referral data
-        pending_referral = context.user_data.get('pending_referral')
-        
         if pending_referral:
             referrer_id = pending_referral['referrer_id']
             
             logger.info(f"💰 Awarding points: Referrer {referrer_id} gets {POINTS_FOR_REFERRAL}, User {user_id} gets {POINTS_FOR_JOINING}")
             
             # Log referral first (to mark user as joined)
-            log_referral(referrer_id, user_id, username, first_name)
+            log_referral(referrer_id, user_id, username, first_name, chat_id)
             
             # Award points - CRITICAL: Get the latest username/first_name from the callback
-            log_activity(referrer_id, None, None, 'referral', POINTS_FOR_REFERRAL, post_id=user_id)
-            log_activity(user_id, username, first_name, 'joining', POINTS_FOR_JOINING)
+            log_activity(referrer_id, None, None, 'referral', POINTS_FOR_REFERRAL, post_id=user_id, chat_id=chat_id)
+            log_activity(user_id, username, first_name, 'joining', POINTS_FOR_JOINING, chat_id=chat_id)
             
             logger.info(f"✅ Points awarded successfully")
             
             # Clear pending referral
-            context.user_data.pop('pending_referral', None)
+            pending_referrals.pop(user_id)
             
             success_text = (
                 f"🎉 *Xush kelibsiz, {escape_markdown(first_name, version=2)}\\!*\n\n"
                 f"✅ Siz *{POINTS_FOR_JOINING} ball* oldingiz\\!\n"
                 f"🎁 Sizni taklif qilgan foydalanuvchi *{POINTS_FOR_REFERRAL} ball* oldi\\!\n\n"
-                f"🇩🇪 *Yevropalik o'zbek* jamoasiga xush kelibsiz\\!\n\n"
+                f"*{group_title(chat_id)}* jamoasiga xush kelibsiz\\!\n\n"
                 f"📌 *Nima qilishingiz mumkin:*\n"
                 f"• Guruhdagi postlarga izoh qoldiring\n"
                 f"• Postlarga reaction bering\n"
@@ -318,146 +343,162 @@ async def check_subscription_callback(update: Update, context: ContextTypes.DEFA
         logger.warning(f"❌ User {user_id} is still not a member")
         await query.answer("❌ Siz hali kanalga qo'shilmagansiz! Iltimos, avval kanalga qo'shiling.", show_alert=True)
 
-async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Display the leaderboard with user's position and date range"""
-    user_id = update.message.from_user.id
-    logger.info(f"🏆 /leaderboard command received from user {user_id}")
+
+LEADERBOARD_TITLES = {7: 'Last 7 Days', 14: 'Last 14 Days', 0: 'All Time'}
+LEADERBOARD_BUTTONS = {7: '7 kun', 14: '14 kun', 0: 'Hammasi'}
+
+
+def format_ranking_line(i: int, user_data: dict) -> str:
+    """One MarkdownV2 leaderboard line for the entry at 0-based rank i"""
+    username = user_data.get('username')
+    first_name = user_data.get('first_name')
+    user_id_display = user_data.get('user_id')
+    score = user_data.get('total_score')
     
-    time_periods = [
-        ('Last 7 Days', 7),
-        ('Last 14 Days', 14),
-    ]
+    # Build display name with better fallback
+    if username:
+        display_name_raw = f"@{username}"
+    elif first_name:
+        display_name_raw = first_name
+    else:
+        display_name_raw = f"Foydalanuvchi #{user_id_display}"
+    
+    display_name_escaped = escape_markdown(display_name_raw, version=2)
+    
+    # Add medals for top 3
+    if i == 0:
+        rank = "🥇"
+    elif i == 1:
+        rank = "🥈"
+    elif i == 2:
+        rank = "🥉"
+    else:
+        rank = f"{i + 1}\\."
+    
+    return f"{rank} {display_name_escaped} \\- {score} pts\n"
 
-    full_leaderboard = ""
+
+def format_digest(snapshot, days: int, size: int, period: str) -> str:
+    """MarkdownV2 digest of the top users of a precomputed snapshot"""
+    entries = snapshot.top(days, size)
+    window = escape_markdown(LEADERBOARD_TITLES.get(days, f"Last {days} Days"), version=2)
+    digest_text = f"📰 *{escape_markdown(period, version=2)} reyting \\({window}\\)*\n\n"
+    for i, user_data in enumerate(entries):
+        digest_text += format_ranking_line(i, user_data)
+    digest_text += "\n📊 /leaderboard \\- to'liq reyting"
+    return digest_text
+
+
+def render_leaderboard_page(snapshot, days: int, page: int, viewer_id: int):
+    """MarkdownV2 text and paging keyboard for one page of a ranking snapshot (no storage or API calls)"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    entries, first_rank, page_count = snapshot.page(days, page, LEADERBOARD_PAGE_SIZE)
+    page = (first_rank - 1) // LEADERBOARD_PAGE_SIZE
+
+    # Calculate date range
+    end_date = datetime.fromtimestamp(snapshot.created, tz=timezone.utc)
+    if days:
+        start_date = end_date - timedelta(days=days)
+        date_range = f"{start_date.strftime('%d %b')} dan {end_date.strftime('%d %b')} gacha hisoblangan"
+    else:
+        date_range = "Barcha vaqt"
+
+    title_escaped = escape_markdown(LEADERBOARD_TITLES.get(days, f"Last {days} Days"), version=2)
+    date_range_escaped = escape_markdown(date_range, version=2)
     
-    for title, days in time_periods:
-        logger.info(f"📊 Generating leaderboard for: {title}")
-        
-        # Calculate date range
-        end_date = datetime.now(timezone.utc)
-        if days:
-            start_date = end_date - timedelta(days=days)
-            date_range = f"{start_date.strftime('%d %b')} dan {end_date.strftime('%d %b')} gacha hisoblangan"
-        else:
-            date_range = "Barcha vaqt"
-        
-        # Get ALL users to find requesting user's position
-        all_users = get_leaderboard(days=days, limit=None)  # Get all users
-        top_users = all_users[:20]  # Top 20 for display
-
-        if not all_users:
-            logger.warning(f"⚠️  No activity for period: {title}")
-            continue
-
-        # Find requesting user's position and data
-        user_position = None
-        user_score = 0
-        user_last_activity = None
-        
-        for idx, user_data in enumerate(all_users):
-            if user_data.get('user_id') == user_id:
-                user_position = idx + 1
-                user_score = user_data.get('total_score', 0)
-                # Get last activity date for this user
-                try:
-                    query = supabase.table('activity_log').select('timestamp').eq('user_id', user_id)
-                    if days:
-                        cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
-                        query = query.gte('timestamp', cutoff_date)
-                    result = query.order('timestamp', desc=True).limit(1).execute()
-                    if result.data:
-                        timestamp_str = result.data[0]['timestamp']
-                        user_last_activity = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                except Exception as e:
-                    logger.error(f"Error getting user's last activity: {e}")
-                break
+    leaderboard_text = f"📊 *Eng faol foydalanuvchilar \\({title_escaped}\\)*\n"
+    leaderboard_text += f"_{date_range_escaped}_\n\n"
 
-        title_escaped = escape_markdown(title, version=2)
-        date_range_escaped = escape_markdown(date_range, version=2)
-        
-        leaderboard_text = f"📊 *Eng faol foydalanuvchilar \\({title_escaped}\\)*\n"
-        leaderboard_text += f"_{date_range_escaped}_\n\n"
+    if not entries:
+        leaderboard_text += "💡 _Bu davrda faollik yo'q\\._\n"
 
-        # Display top 20
-        for i, user_data in enumerate(top_users):
-            username = user_data.get('username')
-            first_name = user_data.get('first_name')
-            user_id_display = user_data.get('user_id')
-            score = user_data.get('total_score')
-            
-            # Improved fallback logic - try to get actual name from Telegram if missing
-            if not username and not first_name:
-                try:
-                    # Try to fetch user info from Telegram
-                    chat_member = await context.bot.get_chat(user_id_display)
-                    first_name = chat_member.first_name
-                    username = chat_member.username
-                    logger.info(f"🔄 Fetched missing user info for {user_id_display}: {first_name} (@{username})")
-                    
-                    # Update database with fetched info
-                    try:
-                        supabase.table('activity_log').update({
-                            'username': username,
-                            'first_name': first_name
-                        }).eq('user_id', user_id_display).execute()
-                        logger.info(f"✅ Updated database with user info for {user_id_display}")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Could not update database: {e}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Could not fetch user info for {user_id_display}: {e}")
-            
-            # Build display name with better fallback
-            if username:
-                display_name_raw = f"@{username}"
-            elif first_name:
-                display_name_raw = first_name
-            else:
-                display_name_raw = f"Foydalanuvchi #{user_id_display}"
-            
-            display_name_escaped = escape_markdown(display_name_raw, version=2)
-            
-            # Add medals for top 3
-            if i == 0:
-                rank = "🥇"
-            elif i == 1:
-                rank = "🥈"
-            elif i == 2:
-                rank = "🥉"
-            else:
-                rank = f"{i + 1}\\."
-            
-            leaderboard_text += f"{rank} {display_name_escaped} \\- {score} pts\n"
-        
-        # Show user's position if they're in the list
-        if user_position:
-            leaderboard_text += f"\n🎯 *Sizning pozitsiyangiz:* \\#{user_position} \\- {user_score} ball"
-            if user_last_activity:
-                last_activity_str = user_last_activity.strftime("%d\\.%m %H:%M")
-                leaderboard_text += f" \\({last_activity_str}\\)"
-        else:
-            leaderboard_text += f"\n💡 _Siz hali faollik ko'rsatmagansiz\\._"
-        
-        full_leaderboard += leaderboard_text + "\n\n"
+    for offset, user_data in enumerate(entries):
+        leaderboard_text += format_ranking_line(first_rank - 1 + offset, user_data)
+    
+    # Show the viewer's position if they're in the ranking
+    user_position, user_score = snapshot.position(viewer_id, days)
+    if user_position:
+        leaderboard_text += f"\n🎯 *Sizning pozitsiyangiz:* \\#{user_position} \\- {user_score} ball"
+        last_ts = snapshot.last_activity.get(viewer_id)
+        if last_ts:
+            last_activity_str = datetime.fromtimestamp(last_ts, tz=timezone.utc).strftime("%d\\.%m %H:%M")
+            leaderboard_text += f" \\({last_activity_str}\\)"
+    else:
+        leaderboard_text += f"\n💡 _Siz hali faollik ko'rsatmagansiz\\._"
+
+    # callback_data: lb:<chat id>:<snapshot id>:<days>:<page>
+    prefix = f"lb:{snapshot.chat_id}:{snapshot.snapshot_id}"
+    nav_row = []
+    if page > 0:
+        nav_row.append(InlineKeyboardButton("◀️", callback_data=f"{prefix}:{days}:{page - 1}"))
+    nav_row.append(InlineKeyboardButton(f"{page + 1}/{page_count}", callback_data=f"{prefix}:{days}:{page}"))
+    if page < page_count - 1:
+        nav_row.append(InlineKeyboardButton("▶️", callback_data=f"{prefix}:{days}:{page + 1}"))
+    window_row = [
+        InlineKeyboardButton(f"• {label} •" if window == days else label, callback_data=f"{prefix}:{window}:0")
+        for window, label in LEADERBOARD_BUTTONS.items()
+    ]
+    return leaderboard_text, InlineKeyboardMarkup([nav_row, window_row])
 
-    if not full_leaderboard:
+
+async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Display the leaderboard with user's position and date range, paged with inline buttons"""
+    user_id = update.message.from_user.id
+    chat_id = resolve_chat_id(update, context.args)
+    logger.info(f"🏆 /leaderboard command received from user {user_id} for chat {chat_id}")
+
+    snapshot = latest_snapshot(chat_id)
+    if not any(snapshot.rankings.values()):
         logger.warning(f"⚠️  No activity recorded at all")
         await update.message.reply_text("Hali hech qanday faollik qayd etilmagan!")
         return
 
+    leaderboard_text, reply_markup = render_leaderboard_page(snapshot, LEADERBOARD_WINDOWS[0], 0, user_id)
+
     try:
-        await update.message.reply_text(full_leaderboard.strip(), parse_mode=constants.ParseMode.MARKDOWN_V2)
+        await update.message.reply_text(leaderboard_text, parse_mode=constants.ParseMode.MARKDOWN_V2, reply_markup=reply_markup)
         logger.info(f"✅ Leaderboard sent successfully")
     except Exception as e:
         logger.error(f"❌ Failed to send leaderboard: {e}")
-        await update.message.reply_text(full_leaderboard.replace('\\', ''))
+        await update.message.reply_text(leaderboard_text.replace('\\', ''), reply_markup=reply_markup)
+
+
+async def leaderboard_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Page or switch window on a leaderboard message, served from its ranking snapshot"""
+    query = update.callback_query
+    _, chat_id, snapshot_id, days, page = query.data.split(':')
+    chat_id = int(chat_id)
+
+    snapshot = get_snapshot(snapshot_id)
+    if snapshot is None:
+        # Expired or from before a restart: re-rank the same chat once and continue from the first page
+        if not get_group(chat_id):
+            await query.answer()
+            return
+        snapshot = latest_snapshot(chat_id)
+        page = 0
+        await query.answer("🔄 Reyting yangilandi")
+    else:
+        await query.answer()
+
+    leaderboard_text, reply_markup = render_leaderboard_page(snapshot, int(days), int(page), query.from_user.id)
+    try:
+        await query.edit_message_text(leaderboard_text, parse_mode=constants.ParseMode.MARKDOWN_V2, reply_markup=reply_markup)
+    except Exception as e:
+        # Telegram rejects edits that do not change the message (e.g. tapping the page counter)
+        logger.info(f"ℹ️ Leaderboard page not edited: {e}")
 
 async def post_contest(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    from config import ADMIN_USER_ID
-    """Post contest leaderboard to the group (admin only)"""
+    """Post contest leaderboard to the group (admin only)
+
+    Usage: /contest [chat_id] [weighted] - the draw mode is fixed when the list is posted.
+    """
     user_id = update.message.from_user.id
-    logger.info(f"🎯 /contest command received from user {user_id}")
+    chat_id = resolve_chat_id(update, context.args)
+    logger.info(f"🎯 /contest command received from user {user_id} for chat {chat_id}")
     
-    if user_id != ADMIN_USER_ID:
+    if not is_group_admin(user_id, chat_id):
         logger.warning(f"🚫 Unauthorized contest post attempt by user {user_id}")
         await update.message.reply_text("You are not authorized to use this command.")
         return
@@ -465,8 +506,9 @@ async def post_contest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"👑 Admin authorized, posting contest leaderboard")
     
     try:
-        # Get top 10 users
-        top_users = get_leaderboard(days=None, limit=10)
+        # Freeze the top users and the draw seed, /pickwinner draws from this same list
+        contest = take_contest_snapshot(chat_id, weighted='weighted' in (context.args or []))
+        top_users = contest.entries
         
         if not top_users:
             await update.message.reply_text("No activity recorded yet!")
@@ -474,7 +516,7 @@ async def post_contest(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Create contest message
         contest_msg = "🎉 *CONTEST FINISHED\\!* 🎉\n\n"
-        contest_msg += "🏆 *Top 10 Users:*\n\n"
+        contest_msg += f"🏆 *Top {len(top_users)} Users:*\n\n"
         
         for i, user_data in enumerate(top_users):
             username = user_data.get('username')
@@ -496,24 +538,20 @@ async def post_contest(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             contest_msg += f"{medal} {display_name_escaped} \\- {score} pts\n"
         
-        contest_msg += "Random winner will be picked from Top 10\\.\n\n"
+        contest_msg += f"Random winner will be picked from Top {len(top_users)}\\.\n"
+        contest_msg += f"🔐 List fingerprint: `{contest.digest()}`, draw commitment: `{contest.commitment()}`\n\n"
         contest_msg += "🎁 *Bonus Points for Comments:*\n"
-        contest_msg += "• 1st comment: 15 points\n"
-        contest_msg += "• 2nd comment: 14 points\n"
-        contest_msg += "• 3rd comment: 13 points\n"
-        contest_msg += "• All other comments: 10 points"
+        contest_msg += format_rule_lines('comment').rstrip("\n")
         
         # Send to group
         sent_message = await context.bot.send_message(
-            chat_id=GROUP_CHAT_ID,
+            chat_id=chat_id,
             text=contest_msg,
             parse_mode=constants.ParseMode.MARKDOWN_V2
         )
         
         # Store contest post ID in context for tracking
-        if 'contest_post_id' not in context.bot_data:
-            context.bot_data['contest_post_id'] = []
-        context.bot_data['contest_post_id'].append(sent_message.message_id)
+        context.bot_data.setdefault('contest_post_id', {}).setdefault(chat_id, []).append(sent_message.message_id)
         
         logger.info(f"✅ Contest posted successfully with message_id: {sent_message.message_id}")
         await update.message.reply_text(f"✅ Contest posted to group! Message ID: {sent_message.message_id}")
@@ -524,12 +562,15 @@ async def post_contest(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def pick_winner(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    from config import ADMIN_USER_ID
-    """Pick a random winner from top 10 users (admin only)"""
+    """Pick a random winner from the contest top users (admin only)
+
+    Usage: /pickwinner [chat_id] - the seed and mode committed by /contest are used.
+    """
     user_id = update.message.from_user.id
-    logger.info(f"🎲 /pickwinner command received from user {user_id}")
+    chat_id = resolve_chat_id(update, context.args)
+    logger.info(f"🎲 /pickwinner command received from user {user_id} for chat {chat_id}")
     
-    if user_id != ADMIN_USER_ID:
+    if not is_group_admin(user_id, chat_id):
         logger.warning(f"🚫 Unauthorized winner pick attempt by user {user_id}")
         await update.message.reply_text("You are not authorized to use this command.")
         return
@@ -537,15 +578,20 @@ async def pick_winner(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"👑 Admin authorized, picking winner")
     
     try:
-        # Get top 10 users
-        top_users = get_leaderboard(days=None, limit=10)
+        # Draw from the list posted by /contest, or take one now if there was none
+        contest = get_contest(chat_id)
+        if contest is None:
+            logger.info(f"📸 No contest posted for chat {chat_id}, taking a snapshot now")
+            contest = take_contest_snapshot(chat_id)
+        top_users = contest.entries
         
         if not top_users:
             await update.message.reply_text("No users to pick from!")
             return
         
-        # Pick random winner
-        winner = random.choice(top_users)
+        # Draw with the committed seed, recorded so it can be reproduced
+        winner, seed = draw_winner(top_users, seed=contest.seed, weighted=contest.weighted)
+        record_draw(contest, winner)
         username = winner.get('username')
         first_name = winner.get('first_name')
         winner_id = winner.get('user_id')
@@ -558,72 +604,275 @@ async def pick_winner(update: Update, context: ContextTypes.DEFAULT_TYPE):
         winner_msg = "🎊 *WINNER ANNOUNCEMENT\\!* 🎊\n\n"
         winner_msg += f"🎉 Congratulations {display_name_escaped}\\!\n\n"
         winner_msg += f"🏆 Score: {score} points\n\n"
-        winner_msg += "You've been randomly selected from our Top 10\\!"
+        winner_msg += f"You've been randomly selected from our Top {len(top_users)}\\!\n\n"
+        draw_kind = "score\\-weighted" if contest.weighted else "uniform"
+        winner_msg += f"🔐 Draw: {draw_kind}, seed `{seed}`, list `{contest.digest()}`, commitment `{contest.commitment()}`"
         
         # Send to group
         await context.bot.send_message(
-            chat_id=GROUP_CHAT_ID,
+            chat_id=chat_id,
             text=winner_msg,
             parse_mode=constants.ParseMode.MARKDOWN_V2
         )
         
         logger.info(f"✅ Winner announced: {display_name_raw}")
-        await update.message.reply_text(f"✅ Winner announced: {display_name_raw}")
+        await update.message.reply_text(f"✅ Winner announced: {display_name_raw} (seed {seed}, contest {contest.contest_id})")
         
     except Exception as e:
         logger.error(f"❌ Error picking winner: {e}")
         await update.message.reply_text(f"❌ Error picking winner: {e}")
 
 
+# Chats with an archive_season in progress
+resets_running = set()
+
+
 async def reset_scores(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    from config import ADMIN_USER_ID
     """Reset scores (admin only) - archives to a separate table"""
     user_id = update.message.from_user.id
-    logger.info(f"🔄 /resettop command received from user {user_id}")
+    chat_id = resolve_chat_id(update, context.args)
+    logger.info(f"🔄 /resettop command received from user {user_id} for chat {chat_id}")
     
-    if user_id != ADMIN_USER_ID:
+    if not is_group_admin(user_id, chat_id):
         logger.warning(f"🚫 Unauthorized reset attempt by user {user_id}")
         await update.message.reply_text("You are not authorized to use this command.")
         return
 
+    if chat_id in resets_running:
+        await update.message.reply_text("A reset of this chat is already running.")
+        return
+
     logger.info(f"👑 Admin authorized, proceeding with reset")
+    resets_running.add(chat_id)
     
     try:
-        # Get all current data
-        logger.info(f"📥 Fetching all activity records")
-        result = supabase.table('activity_log').select('*').execute()
+        # Stream the season into its own archive partition and write its summaries,
+        # off the event loop (a retry resumes an unfinished season)
+        season = await asyncio.to_thread(archive_season, chat_id)
         
-        if result.data:
-            record_count = len(result.data)
-            logger.info(f"📦 Found {record_count} records to archive")
-            
-            # Archive to activity_log_archive with timestamp
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            logger.info(f"🕐 Archive timestamp: {timestamp}")
-            
-            for idx, row in enumerate(result.data):
-                row['archive_timestamp'] = timestamp
-                supabase.table('activity_log_archive').insert(row).execute()
-                if (idx + 1) % 100 == 0:
-                    logger.info(f"📤 Archived {idx + 1}/{record_count} records")
-            
-            logger.info(f"✅ All {record_count} records archived successfully")
-            
-            # Delete all records from main table
-            logger.info(f"🗑️  Deleting records from main table")
-            supabase.table('activity_log').delete().neq('id', 0).execute()
-            logger.info(f"✅ Main table cleared")
+        if season:
+            record_count = season['rows']
+            get_event_store(chat_id).drop_through(season['last_id'])
+            # Scoring workers hold their own copy of the chat's posts
+            worker_pool.broadcast({'kind': 'drop_through', 'chat_id': chat_id, 'last_id': season['last_id']})
+            save_snapshot(event_stores, SNAPSHOT_PATH)
+            # The precomputed rankings still show the archived season
+            ranking_latest.pop(chat_id, None)
             
             # Clear contest post IDs
-            if 'contest_post_id' in context.bot_data:
-                context.bot_data['contest_post_id'] = []
+            context.bot_data.get('contest_post_id', {}).pop(chat_id, None)
             
-            await update.message.reply_text(f"✅ Activity log archived and reset! {record_count} records archived.")
+            await update.message.reply_text(
+                f"✅ Activity log archived and reset! {record_count} records archived "
+                f"as season {season['season_id']} ({season['users']} users, {season['posts']} posts)."
+            )
             logger.info(f"🎉 Reset completed successfully")
         else:
-            logger.info(f"⚠️  No records found to archive")
             await update.message.reply_text("No records to archive.")
             
     except Exception as e:
         logger.error(f"❌ Error resetting scores: {e}")
-        await update.message.reply_text(f"❌ An error occurred while resetting the log: {e}")
\ No newline at end of file
+        await update.message.reply_text(f"❌ An error occurred while resetting the log: {e}\nRun /resettop again to resume.")
+    finally:
+        resets_running.discard(chat_id)
+
+
+async def rescore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Recompute historical points under the current rules (admin only).
+
+    Usage: /rescore [apply] [all] - dry run by default, "all" also covers archived seasons.
+    """
+    user_id = update.message.from_user.id
+    logger.info(f"🔁 /rescore command received from user {user_id}")
+
+    if user_id != ADMIN_USER_ID_EU:
+        logger.warning(f"🚫 Unauthorized rescore attempt by user {user_id}")
+        await update.message.reply_text("You are not authorized to use this command.")
+        return
+
+    chat_id = resolve_chat_id(update, context.args)
+    args = [arg.lower() for arg in (context.args or [])]
+    dry_run = 'apply' not in args
+    seasons = 'all' if 'all' in args else None
+
+    await update.message.reply_text(f"⏳ Rescoring history ({'dry run' if dry_run else 'applying changes'})...")
+
+    try:
+        # Scored in this thread: no process pool is started from inside the bot
+        report = await asyncio.to_thread(rescore, seasons=seasons, dry_run=dry_run, workers=0, chat_id=chat_id)
+
+        if report['applied']:
+            # Row ids are unique across chats, so every partition can take the full change set
+            for store in event_stores.values():
+                store.update_points(report['current_changes'])
+            worker_pool.broadcast({'kind': 'update_points', 'changes': report['current_changes']})
+            save_snapshot(event_stores, SNAPSHOT_PATH)
+            # The precomputed rankings still show the old points
+            ranking_latest.clear()
+
+        await update.message.reply_text(format_report(report))
+        logger.info(f"✅ Rescore finished: {report['changed']} rows changed")
+    except Exception as e:
+        logger.error(f"❌ Error rescoring history: {e}")
+        await update.message.reply_text(f"❌ Error rescoring history: {e}")
+
+
+async def reload_groups_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Re-read the per-group settings file without restarting (admin only)"""
+    user_id = update.message.from_user.id
+    logger.info(f"👥 /reloadgroups command received from user {user_id}")
+
+    if user_id != ADMIN_USER_ID_EU:
+        logger.warning(f"🚫 Unauthorized group reload attempt by user {user_id}")
+        await update.message.reply_text("You are not authorized to use this command.")
+        return
+
+    loaded = load_groups()
+    await update.message.reply_text(f"✅ Tracking {len(loaded)} group(s): {', '.join(str(chat_id) for chat_id in sorted(loaded))}")
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Export data as a compressed file sent back as a document (admin only).
+
+    Usage: /export [activity|referrals|archive|leaderboard] [csv|parquet] [days]
+    """
+    user_id = update.message.from_user.id
+    chat_id = resolve_chat_id(update, context.args)
+    logger.info(f"📤 /export command received from user {user_id} for chat {chat_id}")
+
+    if not is_group_admin(user_id, chat_id):
+        logger.warning(f"🚫 Unauthorized export attempt by user {user_id}")
+        await update.message.reply_text("You are not authorized to use this command.")
+        return
+
+    args = [arg.lower() for arg in (context.args or [])]
+    name = next((arg for arg in args if arg in EXPORT_TABLES or arg == 'leaderboard'), 'activity')
+    fmt = next((arg for arg in args if arg in EXPORT_FORMATS), 'csv')
+    days = next((int(arg) for arg in args if arg.isdigit()), None)
+
+    await update.message.reply_text(f"⏳ Exporting {name} as {fmt}...")
+
+    out_dir = tempfile.mkdtemp(prefix='export_')
+    try:
+        # Paging and compression run in a thread so the event loop keeps serving updates
+        if name == 'leaderboard':
+            path, rows = await asyncio.to_thread(export_leaderboard, out_dir, fmt, chat_id, days)
+        else:
+            path, rows = await asyncio.to_thread(export_table, name, out_dir, fmt, chat_id)
+
+        with open(path, 'rb') as document:
+            await context.bot.send_document(
+                chat_id=update.effective_chat.id,
+                document=document,
+                filename=os.path.basename(path),
+                caption=f"✅ {name}: {rows} rows"
+            )
+        logger.info(f"✅ Export of {name} sent ({rows} rows)")
+    except ImportError:
+        await update.message.reply_text("❌ Parquet export needs pyarrow installed, use csv instead.")
+    except Exception as e:
+        logger.error(f"❌ Error exporting {name}: {e}")
+        await update.message.reply_text(f"❌ Error exporting {name}: {e}")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def format_post_summary(summary: dict) -> str:
+    """Plain-text lines for one post's engagement aggregates"""
+    if summary['time_to_first_comment'] is not None:
+        minutes = summary['time_to_first_comment'] // 60
+        first_comment = f"{minutes // 60}h {minutes % 60}m"
+    else:
+        first_comment = "-"
+    return (
+        f"📌 Post {summary['post_id']}\n"
+        f"💬 Comments: {summary['comments']}  ❤️ Reactions: {summary['reactions']}\n"
+        f"👥 Unique users: {summary['unique_users']}  ⭐️ Points: {summary['points']}\n"
+        f"⏱️ Time to first comment: {first_comment}"
+    )
+
+
+async def post_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show engagement statistics for one post (admin only). Usage: /poststats <post_id>"""
+    user_id = update.message.from_user.id
+    chat_id = resolve_chat_id(update, context.args)
+    logger.info(f"📈 /poststats command received from user {user_id} for chat {chat_id}")
+
+    if not is_group_admin(user_id, chat_id):
+        logger.warning(f"🚫 Unauthorized poststats attempt by user {user_id}")
+        await update.message.reply_text("You are not authorized to use this command.")
+        return
+
+    # Replying to a post works as well as passing its id
+    reply = update.message.reply_to_message
+    if context.args and context.args[0].isdigit():
+        post_id = int(context.args[0])
+    elif reply:
+        post_id = reply.message_id
+    else:
+        await update.message.reply_text("Usage: /poststats <post_id> (or reply to the post)")
+        return
+
+    summary = get_event_store(chat_id).post_summary(post_id)
+    if not summary:
+        await update.message.reply_text(f"No engagement recorded for post {post_id}.")
+        return
+
+    await update.message.reply_text(format_post_summary(summary))
+
+
+async def top_posts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the most engaging recent posts (admin only). Usage: /topposts [days] [comments|reactions|unique_users]"""
+    user_id = update.message.from_user.id
+    chat_id = resolve_chat_id(update, context.args)
+    logger.info(f"🔥 /topposts command received from user {user_id} for chat {chat_id}")
+
+    if not is_group_admin(user_id, chat_id):
+        logger.warning(f"🚫 Unauthorized topposts attempt by user {user_id}")
+        await update.message.reply_text("You are not authorized to use this command.")
+        return
+
+    args = [arg.lower() for arg in (context.args or [])]
+    days = next((int(arg) for arg in args if arg.isdigit()), 7)
+    key = next((arg for arg in args if arg in ('comments', 'reactions', 'unique_users')), 'points')
+
+    top = get_event_store(chat_id).top_posts(days=days, limit=10, key=key)
+    if not top:
+        await update.message.reply_text(f"No post engagement in the last {days} days.")
+        return
+
+    text = f"🔥 Top posts, last {days} days (by {key.replace('_', ' ')})\n\n"
+    text += "\n\n".join(f"{idx + 1}. {format_post_summary(summary)}" for idx, summary in enumerate(top))
+    await update.message.reply_text(text)
+
+
+async def hall_of_fame_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """All-seasons leaderboard and season champions, read from the season summaries"""
+    user_id = update.message.from_user.id
+    chat_id = resolve_chat_id(update, context.args)
+    logger.info(f"🏛️ /halloffame command received from user {user_id} for chat {chat_id}")
+
+    try:
+        fame = hall_of_fame(chat_id, limit=10)
+    except Exception as e:
+        logger.error(f"❌ Error reading season summaries: {e}")
+        await update.message.reply_text("❌ Hall of fame is not available right now.")
+        return
+
+    if not fame['leaders']:
+        await update.message.reply_text("Hali arxivlangan mavsumlar yo'q!")
+        return
+
+    text = "🏛️ *Shon\\-sharaf zali \\(barcha mavsumlar\\)*\n\n"
+    for i, user_data in enumerate(fame['leaders']):
+        line = format_ranking_line(i, user_data).rstrip("\n")
+        text += f"{line} · {user_data['seasons']} mavsum"
+        text += f" · 🏆×{user_data['wins']}\n" if user_data['wins'] else "\n"
+
+    text += "\n👑 *Mavsum g'oliblari:*\n"
+    for champion in fame['champions'][-10:]:
+        name = f"@{champion['username']}" if champion.get('username') else (champion.get('first_name') or f"Foydalanuvchi #{champion['user_id']}")
+        season = escape_markdown(champion['season_id'].split('_')[0], version=2)
+        text += f"  • {season}: {escape_markdown(name, version=2)} \\- {champion['points']} pts\n"
+
+    await update.message.reply_text(text, parse_mode=constants.ParseMode.MARKDOWN_V2)
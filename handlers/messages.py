@@ -2,25 +2,23 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from config import (
-    BOT_IDS_TO_REMOVE, 
-    FIRST_COMMENT_POINTS, 
-    SECOND_COMMENT_POINTS, 
-    THIRD_COMMENT_POINTS, 
-    OTHER_COMMENT_POINTS, 
-    supabase
-)
-from utils.helpers import log_activity
+from config import BOT_IDS_TO_REMOVE, supabase
+from utils.helpers import calculate_points, log_activity
+from utils.event_store import get_event_store
+from utils.groups import get_group
+from utils.workers import worker_pool
+from utils.throttle import award_throttle
 
 logger = logging.getLogger(__name__)
 
 
-def get_comment_position(post_id: int) -> int:
+def get_comment_position(post_id: int, chat_id: int) -> int:
     """Get the position of this comment on the post (1st, 2nd, 3rd, etc.)"""
     try:
         # Count how many comments already exist on this post
         result = supabase.table('activity_log')\
             .select('id')\
+            .eq('chat_id', chat_id)\
             .eq('post_id', post_id)\
             .eq('activity_type', 'comment')\
             .execute()
@@ -33,12 +31,13 @@ def get_comment_position(post_id: int) -> int:
         return 999  # Return high number to give default points
 
 
-def has_user_commented_on_post(user_id: int, post_id: int) -> bool:
+def has_user_commented_on_post(user_id: int, post_id: int, chat_id: int) -> bool:
     """Check if user has already commented on this specific post"""
     try:
         logger.info(f"🔍 Checking if user {user_id} already commented on post {post_id}")
         result = supabase.table('activity_log')\
             .select('id')\
+            .eq('chat_id', chat_id)\
             .eq('user_id', user_id)\
             .eq('post_id', post_id)\
             .eq('activity_type', 'comment')\
@@ -55,10 +54,50 @@ def has_user_commented_on_post(user_id: int, post_id: int) -> bool:
         return False
 
 
+def score_comment(event: dict) -> dict:
+    """Score a comment event and log it, returning the inserted row (or None)"""
+    chat_id = event['chat_id']
+    user_id = event['user_id']
+    post_id = event['post_id']
+    post_timestamp = event['post_timestamp']
+
+    # Check if user has already commented on this post
+    store = get_event_store(chat_id)
+    if store.loaded:
+        already_commented = store.has_commented(user_id, post_id)
+    else:
+        already_commented = has_user_commented_on_post(user_id, post_id, chat_id)
+
+    if already_commented:
+        logger.info(f"🚫 User {user_id} already commented on post {post_id}, skipping points")
+        return None
+
+    # Get comment position for this post
+    if store.loaded:
+        position = store.comment_position(post_id)
+    else:
+        position = get_comment_position(post_id, chat_id)
+    logger.info(f"📍 Comment position on post {post_id}: #{position}")
+    
+    # Award points based on position and post age
+    points = calculate_points('comment', post_timestamp, position)
+    if position <= 3:
+        logger.info(f"{['🥇', '🥈', '🥉'][position - 1]} COMMENT #{position}! Awarding {points} points")
+    else:
+        logger.info(f"💬 Comment #{position}. Awarding {points} points")
+    
+    # Log the activity with awarded points
+    return log_activity(user_id, event['username'], event['first_name'], 'comment', points, post_id, post_timestamp, chat_id)
+
+
 async def handle_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new comments with position-based scoring"""
     user = update.message.from_user
-    logger.info(f"💬 New comment detected from user {user.id} (@{user.username})")
+    chat_id = update.message.chat_id
+    if not get_group(chat_id):
+        return
+
+    logger.info(f"💬 New comment detected from user {user.id} (@{user.username}) in chat {chat_id}")
     
     if user.is_bot or user.id in BOT_IDS_TO_REMOVE:
         logger.info(f"🤖 Skipping bot user {user.id}")
@@ -74,28 +113,23 @@ async def handle_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     logger.info(f"📌 Comment is reply to post {post_id} from {post_timestamp}")
 
-    # Check if user has already commented on this post
-    if has_user_commented_on_post(user.id, post_id):
-        logger.info(f"🚫 User {user.id} already commented on post {post_id}, skipping points")
+    # Spam floods are dropped here, before they cost any storage reads or writes
+    if not award_throttle.allow(chat_id, user.id, post_id, 'comment'):
         return
 
-    # Get comment position for this post
-    position = get_comment_position(post_id)
-    logger.info(f"📍 Comment position on post {post_id}: #{position}")
-    
-    # Award points based on position
-    if position == 1:
-        points = FIRST_COMMENT_POINTS
-        logger.info(f"🥇 FIRST COMMENT! Awarding {points} points")
-    elif position == 2:
-        points = SECOND_COMMENT_POINTS
-        logger.info(f"🥈 SECOND COMMENT! Awarding {points} points")
-    elif position == 3:
-        points = THIRD_COMMENT_POINTS
-        logger.info(f"🥉 THIRD COMMENT! Awarding {points} points")
-    else:
-        points = OTHER_COMMENT_POINTS
-        logger.info(f"💬 Comment #{position}. Awarding {points} points")
-    
-    # Log the activity with awarded points
-    log_activity(user.id, user.username, user.first_name, 'comment', points, post_id, post_timestamp)
\ No newline at end of file
+    event = {
+        'kind': 'comment',
+        'chat_id': chat_id,
+        'user_id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'post_id': post_id,
+        'post_timestamp': post_timestamp,
+    }
+
+    # In multi-process mode the worker owning this post scores it
+    if worker_pool.running:
+        worker_pool.dispatch(event)
+        return
+
+    score_comment(event)
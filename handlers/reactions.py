@@ -5,14 +5,57 @@ from telegram.ext import ContextTypes
 
 from config import BOT_IDS_TO_REMOVE, supabase
 from utils.helpers import calculate_points, log_activity
+from utils.event_store import get_event_store
+from utils.groups import get_group
+from utils.workers import worker_pool
+from utils.throttle import award_throttle
 
 logger = logging.getLogger(__name__)
 
 
+def score_reaction(event: dict) -> dict:
+    """Score a reaction event and log it, returning the inserted row (or None)"""
+    chat_id = event['chat_id']
+    post_id = event['post_id']
+
+    try:
+        # Try to find the original post timestamp from activity_log (or its in-memory copy)
+        store = get_event_store(chat_id)
+        if store.loaded:
+            post_timestamp = store.post_timestamp(post_id)
+        else:
+            result = supabase.table('activity_log').select('post_timestamp').eq('chat_id', chat_id).eq('post_id', post_id).limit(1).execute()
+            post_timestamp = None
+            if result.data and result.data[0].get('post_timestamp'):
+                post_timestamp_str = result.data[0]['post_timestamp']
+                post_timestamp = datetime.fromisoformat(post_timestamp_str.replace('Z', '+00:00'))
+
+        if post_timestamp:
+            # Use stored timestamp from when someone commented
+            logger.info(f"📌 Found original post timestamp: {post_timestamp}")
+        else:
+            # Fallback: assume this is a recent post (within 48 hours for max points)
+            # Or use a conservative estimate
+            post_timestamp = event['date']
+            logger.info(f"⚠️  No post timestamp found, using reaction date: {post_timestamp}")
+
+        # Calculate points based on time since post
+        logger.info(f"➕ Awarding points for reaction")
+        points = calculate_points('reaction', post_timestamp)
+        return log_activity(event['user_id'], event['username'], event['first_name'], 'reaction', points, post_id, post_timestamp, chat_id)
+        
+    except Exception as e:
+        logger.error(f"❌ Error processing reaction: {e}")
+        return None
+
+
 async def handle_reaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new reactions with time-based scoring"""
     reaction_update = update.message_reaction
     user = reaction_update.user
+    chat_id = reaction_update.chat.id
+    if not get_group(chat_id):
+        return
     
     # Skip if user is None (anonymous reactions) or is a bot
     if not user:
@@ -26,29 +69,26 @@ async def handle_reaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     post_id = reaction_update.message_id
-    chat_id = reaction_update.chat.id
     
     logger.info(f"📌 Reaction to message {post_id} in chat {chat_id}")
-    
-    try:
-        # Try to find the original post timestamp from activity_log
-        result = supabase.table('activity_log').select('post_timestamp').eq('post_id', post_id).limit(1).execute()
-        
-        if result.data and result.data[0].get('post_timestamp'):
-            # Use stored timestamp from when someone commented
-            post_timestamp_str = result.data[0]['post_timestamp']
-            post_timestamp = datetime.fromisoformat(post_timestamp_str.replace('Z', '+00:00'))
-            logger.info(f"📌 Found original post timestamp: {post_timestamp}")
-        else:
-            # Fallback: assume this is a recent post (within 48 hours for max points)
-            # Or use a conservative estimate
-            post_timestamp = reaction_update.date
-            logger.info(f"⚠️  No post timestamp found, using reaction date: {post_timestamp}")
 
-        # Calculate points based on time since post
-        logger.info(f"➕ Awarding points for reaction")
-        points = calculate_points('reaction', post_timestamp)
-        log_activity(user.id, user.username, user.first_name, 'reaction', points, post_id, post_timestamp)
-        
-    except Exception as e:
-        logger.error(f"❌ Error processing reaction: {e}")
\ No newline at end of file
+    # Spam floods are dropped here, before they cost any storage reads or writes
+    if not award_throttle.allow(chat_id, user.id, post_id, 'reaction'):
+        return
+
+    event = {
+        'kind': 'reaction',
+        'chat_id': chat_id,
+        'user_id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'post_id': post_id,
+        'date': reaction_update.date,
+    }
+
+    # In multi-process mode the worker owning this post scores it
+    if worker_pool.running:
+        worker_pool.dispatch(event)
+        return
+
+    score_reaction(event)
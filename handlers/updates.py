@@ -0,0 +1,15 @@
+import logging
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from utils.dedup import processed_updates, update_keys
+
+logger = logging.getLogger(__name__)
+
+
+async def drop_duplicate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Stop redelivered updates before any other handler (and storage call) sees them"""
+    keys = update_keys(update)
+    if processed_updates.check_and_add(*keys):
+        logger.info(f"♻️  Duplicate update {update.update_id} dropped ({processed_updates.dropped} so far)")
+        raise ApplicationHandlerStop
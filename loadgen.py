@@ -0,0 +1,316 @@
+"""Synthetic load generator.
+
+Drives generated update streams (comments, reactions, referral /start
+commands, redelivered duplicates) through the bot's real handlers at a
+fixed arrival rate, with an in-memory storage stand-in and a fake Bot API,
+and reports throughput, latency percentiles and event-loop lag.
+
+    python loadgen.py --scenario viral-post
+    python loadgen.py --scenario referral-blast --storage-latency-ms 40
+    python loadgen.py --rate 200 --duration 30 --users 5000 --posts 50 --mix comment=0.4,reaction=0.6
+"""
+import os
+
+# Generated load must never reach the real database: force the in-memory backend before config is imported
+os.environ["STORAGE_BACKEND"] = "memory"
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter, deque
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+from config import GROUP_CHAT_ID, supabase
+from main import register_handlers
+from utils.dedup import processed_updates
+from utils.helpers import load_event_store
+from utils.throttle import award_throttle
+
+logger = logging.getLogger(__name__)
+
+BOT_ID = 1000
+BOT_USERNAME = "loadgen_bot"
+FIRST_USER_ID = 10_000_000
+# Reactions a user cycles through when reacting to the same post again
+REACTION_EMOJI = ("👍", "❤", "🔥", "👏", "😁", "🤩", "🙏", "👌", "🎉", "💯")
+
+# Preset scenarios, any value can be overridden from the command line
+SCENARIOS = {
+    # A viral post: 5,000 reactions in 2 minutes
+    'viral-post': {'rate': 42.0, 'duration': 120.0, 'users': 5000, 'posts': 1,
+                   'mix': {'reaction': 1.0}, 'duplicates': 0.02},
+    # A referral link shared to a 20k-member chat
+    'referral-blast': {'rate': 100.0, 'duration': 200.0, 'users': 20000, 'posts': 1,
+                       'mix': {'referral': 1.0}, 'duplicates': 0.01, 'referrers': 1},
+    # Ordinary busy day
+    'mixed': {'rate': 50.0, 'duration': 60.0, 'users': 1000, 'posts': 20,
+              'mix': {'comment': 0.3, 'reaction': 0.65, 'referral': 0.05}, 'duplicates': 0.01},
+}
+
+
+class FakeBotRequest(BaseRequest):
+    """Bot API stand-in answering every method locally with plausible objects"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = iter(range(1, 1 << 62))
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _result(self, method: str, params: dict):
+        now = int(time.time())
+        if method == 'getMe':
+            return {'id': BOT_ID, 'is_bot': True, 'first_name': "Load Generator", 'username': BOT_USERNAME,
+                    'can_join_groups': True, 'can_read_all_group_messages': True, 'supports_inline_queries': False}
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id') or 0)
+            return {'message_id': next(self._message_ids), 'date': now, 'text': params.get('text', ''),
+                    'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'}}
+        if method == 'getChat':
+            chat_id = int(params.get('chat_id') or 0)
+            return {'id': chat_id, 'type': 'private', 'first_name': f"User {chat_id}"}
+        if method == 'getChatMember':
+            user_id = int(params.get('user_id') or 0)
+            return {'status': 'member', 'user': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"}}
+        return True
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({'ok': True, 'result': self._result(api_method, params)}).encode()
+
+
+class UpdateStream:
+    """Generates update payloads for one scenario, deterministically from a seed"""
+
+    def __init__(self, users: int, posts: int, mix: dict, duplicates: float, referrers: int = 10,
+                 chat_id: int = GROUP_CHAT_ID, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.mix_kinds = list(mix)
+        self.mix_weights = [mix[kind] for kind in self.mix_kinds]
+        self.duplicates = duplicates
+        self.chat = {'id': chat_id, 'type': 'supergroup', 'title': "Load test"}
+        now = int(time.time())
+        # Posts published over the last hour, the first one is the hottest
+        self.posts = [(1_000_000 + idx, now - self.rng.randint(0, 3600)) for idx in range(max(posts, 1))]
+        self.referrers = [FIRST_USER_ID + idx for idx in range(max(referrers, 1))]
+        self.next_joiner = 0
+        self.update_id = 0
+        self.message_id = 2_000_000
+        self.recent = deque(maxlen=1000)
+        self.reactions = Counter()
+        self.counts = Counter()
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}", 'username': f"user{user_id}"}
+
+    def _post(self) -> tuple:
+        # Skewed towards the first posts, like real engagement
+        return self.posts[min(int(self.rng.paretovariate(1.2)) - 1, len(self.posts) - 1)]
+
+    def _comment(self) -> dict:
+        post_id, post_date = self._post()
+        self.message_id += 1
+        return {'message': {
+            'message_id': self.message_id, 'date': int(time.time()), 'chat': self.chat,
+            'from': self._user(FIRST_USER_ID + self.rng.randrange(self.users)), 'text': "load test comment",
+            'reply_to_message': {'message_id': post_id, 'date': post_date, 'chat': self.chat, 'text': "post"},
+        }}
+
+    def _reaction(self) -> dict:
+        post_id, _ = self._post()
+        user_id = FIRST_USER_ID + self.rng.randrange(self.users)
+        # A user reacting to a post again changes their reaction, like a real client
+        changes = self.reactions[(user_id, post_id)]
+        self.reactions[(user_id, post_id)] += 1
+        old = [{'type': 'emoji', 'emoji': REACTION_EMOJI[(changes - 1) % len(REACTION_EMOJI)]}] if changes else []
+        return {'message_reaction': {
+            'chat': self.chat, 'message_id': post_id, 'date': int(time.time()),
+            'user': self._user(user_id),
+            'old_reaction': old, 'new_reaction': [{'type': 'emoji', 'emoji': REACTION_EMOJI[changes % len(REACTION_EMOJI)]}],
+        }}
+
+    def _referral(self) -> dict:
+        # Every joiner is new until the pool is exhausted, then repeat joins start
+        user_id = FIRST_USER_ID + len(self.referrers) + self.next_joiner % self.users
+        self.next_joiner += 1
+        referrer = self.rng.choice(self.referrers)
+        payload = f"ref_{referrer}" if self.chat['id'] == GROUP_CHAT_ID else f"ref_{referrer}_{self.chat['id']}"
+        self.message_id += 1
+        return {'message': {
+            'message_id': self.message_id, 'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': f"User {user_id}"},
+            'from': self._user(user_id), 'text': f"/start {payload}",
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len("/start")}],
+        }}
+
+    def next(self) -> dict:
+        if self.recent and self.rng.random() < self.duplicates:
+            self.counts['duplicate'] += 1
+            # Redelivery of an earlier update, same update_id and payload
+            return json.loads(self.rng.choice(self.recent))
+        kind = self.rng.choices(self.mix_kinds, weights=self.mix_weights)[0]
+        self.counts[kind] += 1
+        self.update_id += 1
+        data = {'update_id': self.update_id, **getattr(self, f"_{kind}")()}
+        self.recent.append(json.dumps(data))
+        return data
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+async def monitor_loop_lag(samples: list, interval: float = 0.01):
+    """Record how late the event loop wakes up a sleeping task"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - started - interval)
+
+
+async def run(args) -> dict:
+    supabase.latency = args.storage_latency_ms / 1000
+    bot_api = FakeBotRequest(args.api_latency_ms / 1000)
+    builder = Application.builder().token(f"{BOT_ID}:loadgen").request(bot_api).get_updates_request(FakeBotRequest())
+    if args.concurrent_updates:
+        builder = builder.concurrent_updates(args.concurrent_updates)
+    application = builder.build()
+    register_handlers(application)
+
+    errors = Counter()
+
+    async def count_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    application.add_error_handler(count_error)
+    await application.initialize()
+    load_event_store()
+
+    stream = UpdateStream(args.users, args.posts, args.mix, args.duplicates, args.referrers, args.chat, args.seed)
+    total = int(args.rate * args.duration)
+    loop = asyncio.get_running_loop()
+    latencies = []
+    lag = []
+    lag_task = asyncio.create_task(monitor_loop_lag(lag))
+
+    async def deliver(update: Update, arrival: float):
+        # Same path as polling: through the update processor, so concurrency limits apply
+        await application.update_processor.process_update(update, application.process_update(update))
+        latencies.append(loop.time() - arrival)
+
+    logger.warning(f"🚚 Sending {total} updates at {args.rate}/s ({args.duration:.0f}s)")
+    tasks = []
+    started = loop.time()
+    for idx in range(total):
+        arrival = started + idx / args.rate
+        delay = arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = Update.de_json(stream.next(), application.bot)
+        tasks.append(asyncio.create_task(deliver(update, arrival)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+
+    lag_task.cancel()
+    await application.shutdown()
+
+    return {
+        'updates': total,
+        'generated': dict(stream.counts),
+        'duplicates_dropped': processed_updates.dropped,
+        'throttled': dict(award_throttle.dropped),
+        'errors': dict(errors),
+        'elapsed_s': round(elapsed, 2),
+        'offered_rate': args.rate,
+        'throughput_per_s': round(total / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {f"p{pct}": round(percentile(latencies, pct) * 1000, 2) for pct in (50, 95, 99, 100)},
+        'loop_lag_ms': {f"p{pct}": round(percentile(lag, pct) * 1000, 2) for pct in (50, 99, 100)},
+        'storage_calls': supabase.calls,
+        'rows': {table: len(rows) for table, rows in supabase.tables.items()},
+        'bot_api_calls': dict(bot_api.calls),
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"Updates sent:     {report['updates']} {report['generated']}",
+        f"Duplicates dropped: {report['duplicates_dropped']}",
+        f"Throttled:        {report['throttled'] or 'none'}",
+        f"Handler errors:   {report['errors'] or 'none'}",
+        f"Elapsed:          {report['elapsed_s']}s",
+        f"Throughput:       {report['throughput_per_s']}/s (offered {report['offered_rate']}/s)",
+        "Latency (ms):     " + "  ".join(f"{k}={v}" for k, v in report['latency_ms'].items()),
+        "Loop lag (ms):    " + "  ".join(f"{k}={v}" for k, v in report['loop_lag_ms'].items()),
+        f"Storage calls:    {report['storage_calls']}  rows {report['rows']}",
+        f"Bot API calls:    {report['bot_api_calls']}",
+    ]
+    return "\n".join(lines)
+
+
+def parse_mix(value: str) -> dict:
+    """comment=0.3,reaction=0.7 -> {'comment': 0.3, 'reaction': 0.7}"""
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in ('comment', 'reaction', 'referral'):
+            raise argparse.ArgumentTypeError(f"unknown event kind: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive synthetic update bursts through the bot's handlers")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--rate', type=float, help="updates per second")
+    parser.add_argument('--duration', type=float, help="seconds of traffic")
+    parser.add_argument('--users', type=int, help="size of the user pool")
+    parser.add_argument('--posts', type=int, help="number of posts engaged with")
+    parser.add_argument('--mix', type=parse_mix, help="event mix, e.g. comment=0.3,reaction=0.6,referral=0.1")
+    parser.add_argument('--duplicates', type=float, help="fraction of updates redelivered")
+    parser.add_argument('--referrers', type=int, help="users whose referral links are shared")
+    parser.add_argument('--chat', type=int, default=GROUP_CHAT_ID, help="tracked chat the traffic goes to")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--storage-latency-ms', type=float, default=0.0, help="simulated storage round trip")
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help="simulated Bot API round trip")
+    parser.add_argument('--concurrent-updates', type=int, default=0, help="as Application.concurrent_updates (0 = bot default)")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    preset = {'referrers': 10, **SCENARIOS[args.scenario]}
+    for name, value in preset.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+
+    logging.getLogger().setLevel(args.log_level)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == '__main__':
+    main()
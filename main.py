@@ -1,19 +1,34 @@
+import asyncio
 import logging
 import os
-from telegram import Update
-from telegram.ext import Application, MessageHandler, MessageReactionHandler, CommandHandler, filters, ContextTypes
+from datetime import time as dt_time, timezone
+from telegram import Update, constants
+from telegram.ext import Application, MessageHandler, MessageReactionHandler, CommandHandler, TypeHandler, filters, ContextTypes
 from dotenv import load_dotenv
 
 from config import (
     BOT_TOKEN, GROUP_CHAT_ID, ADMIN_USER_ID_EU, 
-    EARLY_WINDOW_HOURS, POINTS_FOR_COMMENT_EARLY, 
-    POINTS_FOR_COMMENT_LATE, POINTS_FOR_REACTION_EARLY, 
-    POINTS_FOR_REACTION_LATE
+    SNAPSHOT_PATH, SNAPSHOT_INTERVAL_SECONDS, SPOOL_REPLAY_INTERVAL_SECONDS,
+    RANKING_REFRESH_SECONDS,
+    LEADERBOARD_DIGEST, LEADERBOARD_DIGEST_TIME, LEADERBOARD_DIGEST_SIZE
 )
 from telegram.ext import CallbackQueryHandler
-from handlers.commands import start_command, show_leaderboard, reset_scores, post_contest, pick_winner, referral_command, check_subscription_callback
+from handlers.commands import start_command, show_leaderboard, reset_scores, post_contest, pick_winner, referral_command, check_subscription_callback, rescore_command, reload_groups_command, export_command, post_stats_command, top_posts_command, leaderboard_page_callback, format_digest, hall_of_fame_command
 from handlers.messages import handle_comment
 from handlers.reactions import handle_reaction
+from handlers.updates import drop_duplicate_updates
+from utils.helpers import load_event_store, apply_replayed_rows
+from utils.event_store import event_stores
+from utils.groups import groups
+from utils.workers import worker_pool
+from utils.dedup import processed_updates
+from utils.throttle import award_throttle
+from utils.referrals import pending_referrals
+from utils.spool import journal, replay_spool
+from utils.snapshot import load_snapshot, save_snapshot
+from utils.ranking import latest_snapshot, precompute_rankings, register_snapshot
+from utils.names import name_resolver
+from utils.scoring import scoring_rules
 
 load_dotenv()
 
@@ -22,20 +37,80 @@ logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s
 logger = logging.getLogger(__name__)
 
 
-def main():
-    """Start the bot"""
-    logger.info("=" * 60)
-    logger.info("🤖 TELEGRAM ACTIVITY TRACKER BOT STARTING")
-    logger.info("=" * 60)
-    logger.info(f"📍 Group Chat ID: {GROUP_CHAT_ID}")
-    logger.info(f"👑 Admin User ID: {ADMIN_USER_ID_EU}")
-    logger.info(f"⏰ Early Window: {EARLY_WINDOW_HOURS} hours")
-    logger.info(f"💬 Comment Points: {POINTS_FOR_COMMENT_EARLY} (early) / {POINTS_FOR_COMMENT_LATE} (late)")
-    logger.info(f"❤️  Reaction Points: {POINTS_FOR_REACTION_EARLY} (early) / {POINTS_FOR_REACTION_LATE} (late)")
-    logger.info("=" * 60)
-    
-    application = Application.builder().token(BOT_TOKEN).build()
-    group_filter = filters.Chat(chat_id=GROUP_CHAT_ID)
+async def on_startup(application: Application):
+    """Warm up in-memory state before polling starts"""
+    # Load the last checkpoint, then replay only the rows written after it
+    load_snapshot(event_stores, SNAPSHOT_PATH, journal.pending_tokens())
+    load_event_store()
+    processed_updates.load()
+    processed_updates.open_journal()
+    worker_pool.start()
+
+
+async def on_shutdown(application: Application):
+    """Checkpoint in-memory state so the next start is warm"""
+    await worker_pool.stop()
+    journal.sync()
+    save_snapshot(event_stores, SNAPSHOT_PATH)
+    processed_updates.save()
+    processed_updates.close()
+
+
+async def checkpoint_job(context: ContextTypes.DEFAULT_TYPE):
+    """Periodically checkpoint the event stores and compact the processed update keys"""
+    save_snapshot(event_stores, SNAPSHOT_PATH)
+    processed_updates.save()
+    pending_referrals.purge()
+    if award_throttle.dropped:
+        logger.info(f"🧯 Throttled events so far: {dict(award_throttle.dropped)} ({len(award_throttle)} users tracked)")
+
+
+async def spool_replay_job(context: ContextTypes.DEFAULT_TYPE):
+    """Flush the local spool and replay it off the event loop once storage recovers"""
+    journal.sync()
+    if journal.pending():
+        replayed = await asyncio.to_thread(replay_spool, apply_replayed_rows)
+        if replayed:
+            # Checkpoint the resolved ids so the replayed rows are not loaded twice after a crash
+            save_snapshot(event_stores, SNAPSHOT_PATH)
+
+
+async def ranking_refresh_job(context: ContextTypes.DEFAULT_TYPE):
+    """Precompute every group's rankings so /leaderboard only reads the result"""
+    # Ranking is CPU bound: build the snapshots off the event loop, resolve names on it
+    for snapshot in await asyncio.to_thread(precompute_rankings):
+        register_snapshot(snapshot)
+        # Resolve every missing name now, pages are rendered from the snapshot alone
+        missing = snapshot.missing_names()
+        if missing:
+            snapshot.fill_names(await name_resolver.resolve(context.bot, missing))
+
+
+async def digest_job(context: ContextTypes.DEFAULT_TYPE):
+    """Post the scheduled leaderboard digest to the main group"""
+    period = "Haftalik" if LEADERBOARD_DIGEST == "weekly" else "Kunlik"
+    snapshot = latest_snapshot(GROUP_CHAT_ID)
+    if not snapshot.ranking(7):
+        logger.info(f"📰 No activity in the last 7 days, digest skipped")
+        return
+    try:
+        await context.bot.send_message(
+            chat_id=GROUP_CHAT_ID,
+            text=format_digest(snapshot, 7, LEADERBOARD_DIGEST_SIZE, period),
+            parse_mode=constants.ParseMode.MARKDOWN_V2
+        )
+        logger.info(f"📰 {LEADERBOARD_DIGEST} digest posted to {GROUP_CHAT_ID}")
+    except Exception as e:
+        logger.error(f"❌ Failed to post leaderboard digest: {e}")
+
+
+def register_handlers(application: Application):
+    """Register the update handlers (shared by the bot and the load generator)"""
+    # Groups can be added at runtime (/reloadgroups), so the handlers check the chat themselves
+    group_filter = filters.ChatType.GROUPS
+
+    # Redelivered updates are dropped before any other handler runs
+    application.add_handler(TypeHandler(Update, drop_duplicate_updates), group=-1)
 
     # Command handlers
     application.add_handler(CommandHandler("start", start_command))
@@ -44,13 +119,43 @@ def main():
     application.add_handler(CommandHandler("contest", post_contest))
     application.add_handler(CommandHandler("pickwinner", pick_winner))
     application.add_handler(CommandHandler("referral", referral_command))
+    application.add_handler(CommandHandler("rescore", rescore_command))
+    application.add_handler(CommandHandler("reloadgroups", reload_groups_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("poststats", post_stats_command))
+    application.add_handler(CommandHandler("topposts", top_posts_command))
+    application.add_handler(CommandHandler("halloffame", hall_of_fame_command))
     application.add_handler(CallbackQueryHandler(check_subscription_callback, pattern="^check_subscription_referral$"))
-
-
+    application.add_handler(CallbackQueryHandler(leaderboard_page_callback, pattern="^lb:"))
 
     # Message and reaction handlers (award points)
     application.add_handler(MessageHandler(group_filter & filters.TEXT & ~filters.COMMAND, handle_comment))
-    application.add_handler(MessageReactionHandler(handle_reaction, chat_id=GROUP_CHAT_ID))
+    application.add_handler(MessageReactionHandler(handle_reaction))
+
+
+def main():
+    """Start the bot"""
+    logger.info("=" * 60)
+    logger.info("🤖 TELEGRAM ACTIVITY TRACKER BOT STARTING")
+    logger.info("=" * 60)
+    logger.info(f"📍 Group Chat IDs: {sorted(groups)} (default {GROUP_CHAT_ID})")
+    logger.info(f"👑 Admin User ID: {ADMIN_USER_ID_EU}")
+    for activity_type in scoring_rules.rules:
+        logger.info(f"🎯 {activity_type} points: {'; '.join(scoring_rules.describe(activity_type))}")
+    logger.info("=" * 60)
+    
+    application = Application.builder().token(BOT_TOKEN).post_init(on_startup).post_shutdown(on_shutdown).build()
+    register_handlers(application)
+
+    application.job_queue.run_repeating(checkpoint_job, interval=SNAPSHOT_INTERVAL_SECONDS, first=SNAPSHOT_INTERVAL_SECONDS)
+    application.job_queue.run_repeating(spool_replay_job, interval=SPOOL_REPLAY_INTERVAL_SECONDS, first=SPOOL_REPLAY_INTERVAL_SECONDS)
+    application.job_queue.run_repeating(ranking_refresh_job, interval=RANKING_REFRESH_SECONDS, first=1)
+    if LEADERBOARD_DIGEST in ("daily", "weekly"):
+        hour, minute = (int(part) for part in LEADERBOARD_DIGEST_TIME.split(":"))
+        # JobQueue days run 0-6 from Sunday; weekly digests go out on Mondays
+        days = (1,) if LEADERBOARD_DIGEST == "weekly" else tuple(range(7))
+        application.job_queue.run_daily(digest_job, time=dt_time(hour, minute, tzinfo=timezone.utc), days=days)
+        logger.info(f"📰 {LEADERBOARD_DIGEST} leaderboard digest scheduled at {LEADERBOARD_DIGEST_TIME} UTC")
 
     logger.info("✅ All handlers registered")
     logger.info("🚀 Starting polling...")
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import secrets
+import time
+
+from config import CONTEST_TOP_K, CONTEST_DRAW_LOG
+from utils.helpers import get_leaderboard
+
+logger = logging.getLogger(__name__)
+
+
+class ContestSnapshot:
+    """Top-K ranking of a chat frozen when the contest is announced.
+
+    /pickwinner draws from exactly the list that was posted, even if points
+    keep coming in (or the season is reset) in between. The draw seed and
+    mode are fixed here too and only their commitment is published with the
+    list, so nobody can pick a seed after seeing the candidates.
+    """
+
+    def __init__(self, chat_id: int, entries: list, weighted: bool = False, seed: int = None,
+                 contest_id: str = None, created: float = None):
+        self.contest_id = contest_id or secrets.token_hex(4)
+        self.chat_id = chat_id
+        self.created = created or time.time()
+        self.entries = tuple(entries)
+        self.weighted = weighted
+        self.seed = secrets.randbits(64) if seed is None else seed
+
+    def digest(self) -> str:
+        """Short fingerprint of the candidate list, published with the draw"""
+        lines = "".join(f"{entry['user_id']}:{entry['total_score']}\n" for entry in self.entries)
+        return hashlib.sha256(lines.encode()).hexdigest()[:16]
+
+    def commitment(self) -> str:
+        """Hash published with the list; revealing the seed at the draw lets anyone check it"""
+        mode = 'weighted' if self.weighted else 'uniform'
+        return hashlib.sha256(f"{self.contest_id}:{self.seed}:{mode}".encode()).hexdigest()[:16]
+
+    def to_record(self) -> dict:
+        return {
+            'type': 'contest',
+            'contest_id': self.contest_id,
+            'chat_id': self.chat_id,
+            'snapshot_at': self.created,
+            'digest': self.digest(),
+            'commitment': self.commitment(),
+            'seed': self.seed,
+            'weighted': self.weighted,
+            'entries': list(self.entries),
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> 'ContestSnapshot':
+        return cls(record['chat_id'], record['entries'], record['weighted'], record['seed'],
+                   record['contest_id'], record['snapshot_at'])
+
+
+# Latest contest per chat, persisted in the draw log
+contests = {}
+
+
+def _append_log(record: dict, path: str = CONTEST_DRAW_LOG) -> bool:
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+    except Exception as e:
+        logger.error(f"❌ Could not write to the contest log: {e}")
+        return False
+
+
+def take_contest_snapshot(chat_id: int, k: int = CONTEST_TOP_K, weighted: bool = False) -> ContestSnapshot:
+    """Select the all-time top k of a chat and keep it as the chat's current contest.
+
+    The contest is written to the draw log before it is announced, so
+    /pickwinner still draws from it after a restart.
+    """
+    contest = ContestSnapshot(chat_id, get_leaderboard(days=None, limit=k, chat_id=chat_id), weighted)
+    if not _append_log(contest.to_record()):
+        raise RuntimeError("contest could not be saved, not announcing it")
+    contests[chat_id] = contest
+    logger.info(f"📸 Contest {contest.contest_id} for chat {chat_id}: {len(contest.entries)} candidates ({contest.digest()})")
+    return contest
+
+
+def load_contest(chat_id: int, path: str = CONTEST_DRAW_LOG) -> ContestSnapshot:
+    """The chat's last contest recorded in the draw log, or None"""
+    if not os.path.exists(path):
+        return None
+    record = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('type') == 'contest' and entry.get('chat_id') == chat_id:
+                record = entry
+    return ContestSnapshot.from_record(record) if record else None
+
+
+def get_contest(chat_id: int) -> ContestSnapshot:
+    """The chat's last announced contest, or None"""
+    contest = contests.get(chat_id)
+    if contest is None:
+        contest = load_contest(chat_id)
+        if contest is not None:
+            contests[chat_id] = contest
+            logger.info(f"📥 Contest {contest.contest_id} for chat {chat_id} reloaded from the draw log")
+    return contest
+
+
+def draw_winner(entries, seed: int = None, weighted: bool = False) -> tuple:
+    """Draw a winner with a dedicated seeded generator. Returns (winner, seed).
+
+    Re-running with the same candidates and seed gives the same winner, so a
+    draw can be checked afterwards. weighted=True makes the chance
+    proportional to score.
+    """
+    if seed is None:
+        seed = secrets.randbits(32)
+    rng = random.Random(seed)
+    weights = [max(entry['total_score'], 0) for entry in entries] if weighted else None
+    if weights and any(weights):
+        winner = rng.choices(entries, weights=weights)[0]
+    else:
+        winner = rng.choice(entries)
+    return winner, seed
+
+
+def record_draw(contest: ContestSnapshot, winner: dict, path: str = CONTEST_DRAW_LOG):
+    """Append the draw and everything needed to reproduce it to the audit log"""
+    record = {
+        'type': 'draw',
+        'contest_id': contest.contest_id,
+        'chat_id': contest.chat_id,
+        'snapshot_at': int(contest.created),
+        'drawn_at': int(time.time()),
+        'digest': contest.digest(),
+        'commitment': contest.commitment(),
+        'candidates': [[entry['user_id'], entry['total_score']] for entry in contest.entries],
+        'seed': contest.seed,
+        'weighted': contest.weighted,
+        'winner': winner['user_id'],
+    }
+    _append_log(record, path)
+    logger.info(f"🎲 Contest {contest.contest_id} draw: seed={contest.seed} weighted={contest.weighted} winner={winner['user_id']}")
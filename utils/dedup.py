@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import time
+
+from config import DEDUP_PATH, DEDUP_TTL_SECONDS, DEDUP_MAX_KEYS, DEDUP_FSYNC_BATCH, DEDUP_FSYNC_SECONDS
+from utils.expiring import ExpiringMap
+
+logger = logging.getLogger(__name__)
+
+
+class RecentKeys:
+    """Time-windowed, size-bounded set of processed keys.
+
+    Keys map to the time they were first seen in an ExpiringMap, so memory
+    stays under max_keys entries whatever the update rate.
+
+    Once open_journal() has been called, every recorded key is also appended
+    to a JSON-lines journal: flushed to the OS immediately, fsync batched
+    every fsync_batch keys or fsync_seconds. save() compacts the journal down
+    to the live keys.
+    """
+
+    def __init__(self, ttl_seconds: int, max_keys: int, fsync_batch: int = DEDUP_FSYNC_BATCH,
+                 fsync_seconds: float = DEDUP_FSYNC_SECONDS):
+        self.fsync_batch = fsync_batch
+        self.fsync_seconds = fsync_seconds
+        self.keys = ExpiringMap(ttl_seconds, max_keys)
+        self.dropped = 0
+        self.path = None
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def check_and_add(self, *keys: str) -> bool:
+        """Record the keys; return True if any of them was already seen (a duplicate)"""
+        now = time.time()
+        if any(key in self.keys for key in keys):
+            self.dropped += 1
+            return True
+        for key in keys:
+            self.keys.set(key, now, now=now)
+        self._journal(keys, now)
+        return False
+
+    def _journal(self, keys: tuple, now: float):
+        if self._file is None:
+            return
+        try:
+            self._file.write("".join(json.dumps([key, now]) + "\n" for key in keys))
+            self._file.flush()
+            self._unsynced += len(keys)
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_seconds:
+                self.sync()
+        except Exception as e:
+            logger.error(f"❌ Error journaling processed update keys: {e}")
+
+    def sync(self):
+        """fsync keys still only in the OS cache"""
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def open_journal(self, path: str = DEDUP_PATH):
+        """Start appending recorded keys to path"""
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def save(self, path: str = None):
+        """Compact the journal to the live keys (rewritten aside, then swapped in)"""
+        path = path or self.path or DEDUP_PATH
+        self.keys.evict()
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps([key, seen]) + "\n" for key, seen in self.keys.items())
+                f.flush()
+                os.fsync(f.fileno())
+            reopen = self._file is not None and path == self.path
+            if reopen:
+                self.close()
+            os.replace(tmp_path, path)
+            if reopen:
+                self.open_journal(path)
+            logger.info(f"💾 Saved {len(self.keys)} processed update keys to {path}")
+        except Exception as e:
+            logger.error(f"❌ Error saving processed update keys: {e}")
+
+    def load(self, path: str = DEDUP_PATH):
+        """Load journaled keys, dropping the ones that have expired.
+
+        A line cut short by a crash is skipped.
+        """
+        if not os.path.exists(path):
+            return
+        skipped = 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        key, seen = json.loads(line)
+                    except (ValueError, TypeError):
+                        skipped += 1
+                        continue
+                    if key not in self.keys:
+                        self.keys.set(key, seen, now=seen)
+            self.keys.evict()
+            logger.info(f"📥 Loaded {len(self.keys)} processed update keys from {path}"
+                        + (f" ({skipped} unreadable line(s) skipped)" if skipped else ""))
+        except Exception as e:
+            logger.error(f"❌ Error loading processed update keys: {e}")
+
+
+def reaction_state(reactions) -> str:
+    """Order-independent description of a reaction list (emoji, custom emoji ids, paid)"""
+    items = []
+    for reaction in reactions or ():
+        value = getattr(reaction, 'emoji', None) or getattr(reaction, 'custom_emoji_id', None) or reaction.type
+        items.append(str(value))
+    return ",".join(sorted(items))
+
+
+def update_keys(update) -> tuple:
+    """Idempotency keys for an update: its update_id plus the underlying event.
+
+    A reaction event is identified by the transition it carries (old -> new
+    reactions), not by its date: two real changes by one user in the same
+    second differ in their payload, a redelivery does not. Repeating the
+    same transition within the TTL (remove, then add the same emoji again)
+    is seen once, so toggling a reaction does not score again.
+    """
+    keys = [f"u:{update.update_id}"]
+    if update.message and update.message.from_user:
+        message = update.message
+        keys.append(f"m:{message.chat_id}:{message.message_id}:{message.from_user.id}")
+    elif update.message_reaction and update.message_reaction.user:
+        reaction = update.message_reaction
+        keys.append(f"r:{reaction.chat.id}:{reaction.message_id}:{reaction.user.id}:"
+                    f"{reaction_state(reaction.old_reaction)}>{reaction_state(reaction.new_reaction)}")
+    return tuple(keys)
+
+
+processed_updates = RecentKeys(DEDUP_TTL_SECONDS, DEDUP_MAX_KEYS)
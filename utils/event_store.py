@@ -0,0 +1,417 @@
+import heapq
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from itertools import compress, islice
+from operator import itemgetter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+# Activity types are stored as small integer codes, new types get the next free code
+ACTIVITY_TYPES = ['comment', 'reaction', 'referral', 'joining']
+ACTIVITY_TYPE_CODES = {name: code for code, name in enumerate(ACTIVITY_TYPES)}
+COMMENT_CODE = ACTIVITY_TYPE_CODES['comment']
+REACTION_CODE = ACTIVITY_TYPE_CODES['reaction']
+
+
+def activity_type_code(activity_type: str) -> int:
+    """Return the integer code for an activity type, registering unknown types"""
+    code = ACTIVITY_TYPE_CODES.get(activity_type)
+    if code is None:
+        code = len(ACTIVITY_TYPES)
+        ACTIVITY_TYPES.append(activity_type)
+        ACTIVITY_TYPE_CODES[activity_type] = code
+        logger.info(f"🆕 Registered activity type '{activity_type}' with code {code}")
+    return code
+
+
+def parse_timestamp(value) -> int:
+    """Convert a PostgREST timestamp (or datetime) to epoch seconds"""
+    if value is None:
+        return 0
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def days_to_cutoff(days: int = None) -> int:
+    """Epoch seconds cutoff for a "last N days" window, None for all time"""
+    if not days:
+        return None
+    return int(time.time()) - days * SECONDS_PER_DAY
+
+
+class PostStats:
+    """Running engagement aggregates for one post"""
+
+    __slots__ = ('comments', 'reactions', 'points', 'users', 'first_comment', 'first_seen')
+
+    def __init__(self, first_seen: int):
+        self.comments = 0
+        self.reactions = 0
+        self.points = 0
+        self.users = set()
+        self.first_comment = 0
+        self.first_seen = first_seen
+
+
+class EventStore:
+    """Append-only columnar store of activity_log rows.
+
+    Every column lives in a typed array, so a row costs ~41 bytes instead of a
+    PostgREST dict. Names are kept once per user in a side table. Rows are
+    appended as they happen, which keeps timestamps sorted and lets a time
+    window be located with a binary search instead of a scan, and windowed
+    aggregations are numpy group-bys over the columns. Ids are not
+    assumed to be sorted: spooled rows carry a provisional negative id until
+    they are replayed, and worker rows arrive in any order.
+
+    The per-post lookups used by the handlers (comment counts, who already
+    commented, post timestamps), the per-post engagement aggregates and the
+    all-time per-user totals are derived from the columns and kept up to
+    date on append, so they never need to be persisted separately.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.user_ids = array('q')
+        self.types = array('B')
+        self.points = array('i')
+        self.timestamps = array('q')
+        self.post_ids = array('q')
+        self.post_timestamps = array('q')
+        self.profiles = {}
+        self.comment_counts = {}
+        self.commenters = set()
+        self.post_times = {}
+        self.post_stats = {}
+        self.user_totals = {}
+        self.last_id = 0
+        self.floor_id = 0
+        # Ids above last_id already held, from a snapshot taken while worker rows were in flight
+        self.held_ids = set()
+        self.loaded = False
+        self._sorted = True
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, row_id: int, user_id: int, activity_type: str, points: int, timestamp: int, post_id: int = None,
+               username: str = None, first_name: str = None, post_timestamp: int = 0):
+        """Append one activity row (rows archived by a season reset are ignored)"""
+        if row_id and 0 < row_id <= self.floor_id:
+            return
+        if row_id in self.held_ids:
+            self.held_ids.discard(row_id)
+            return
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            self._sorted = False
+        code = activity_type_code(activity_type)
+        self.ids.append(row_id or 0)
+        self.user_ids.append(user_id)
+        self.types.append(code)
+        self.points.append(points or 0)
+        self.timestamps.append(timestamp)
+        self.post_ids.append(post_id or 0)
+        self.post_timestamps.append(post_timestamp or 0)
+        self._index(user_id, code, post_id, post_timestamp, timestamp, points or 0)
+        self.user_totals[user_id] = self.user_totals.get(user_id, 0) + (points or 0)
+        if row_id and row_id > self.last_id:
+            self.last_id = row_id
+        if username or first_name or user_id not in self.profiles:
+            self.profiles[user_id] = (username, first_name)
+
+    def _index(self, user_id: int, code: int, post_id: int, post_timestamp: int, timestamp: int, points: int):
+        """Update the derived per-post lookups and aggregates for one row"""
+        # Referral rows reuse post_id for the referred user, only comments and reactions are about posts
+        if not post_id or code not in (COMMENT_CODE, REACTION_CODE):
+            return
+        # A comment carries the real post date (the message it replies to); a reaction may carry its own
+        # date as a fallback, so it only stands in until a comment on the post is seen
+        if post_timestamp and (code == COMMENT_CODE or post_id not in self.post_times):
+            self.post_times[post_id] = post_timestamp
+
+        stats = self.post_stats.get(post_id)
+        if stats is None:
+            stats = self.post_stats[post_id] = PostStats(timestamp)
+        stats.points += points
+        stats.users.add(user_id)
+
+        if code == COMMENT_CODE:
+            self.comment_counts[post_id] = self.comment_counts.get(post_id, 0) + 1
+            self.commenters.add((user_id, post_id))
+            stats.comments += 1
+            if not stats.first_comment or timestamp < stats.first_comment:
+                stats.first_comment = timestamp
+        else:
+            stats.reactions += 1
+
+    def reindex(self):
+        """Rebuild the derived lookups from the columns (after loading a snapshot)"""
+        self.comment_counts = {}
+        self.commenters = set()
+        self.post_times = {}
+        self.post_stats = {}
+        self.user_totals = {}
+        totals = self.user_totals
+        for user_id, code, post_id, post_timestamp, timestamp, points in zip(
+                self.user_ids, self.types, self.post_ids, self.post_timestamps, self.timestamps, self.points):
+            self._index(user_id, code, post_id, post_timestamp, timestamp, points)
+            totals[user_id] = totals.get(user_id, 0) + points
+        self._sorted = all(a <= b for a, b in zip(self.timestamps, islice(self.timestamps, 1, None)))
+
+    def append_row(self, row: dict):
+        """Append a row as returned by PostgREST"""
+        self.append(
+            row.get('id'),
+            row['user_id'],
+            row['activity_type'],
+            row['points'],
+            parse_timestamp(row.get('timestamp')),
+            row.get('post_id'),
+            row.get('username'),
+            row.get('first_name'),
+            parse_timestamp(row.get('post_timestamp')),
+        )
+
+    def comment_position(self, post_id: int) -> int:
+        """Position the next comment on this post will take (1st, 2nd, ...)"""
+        return self.comment_counts.get(post_id, 0) + 1
+
+    def has_commented(self, user_id: int, post_id: int) -> bool:
+        """Whether the user already has a scored comment on this post"""
+        return (user_id, post_id) in self.commenters
+
+    def post_timestamp(self, post_id: int) -> datetime:
+        """Known publication time of a post, or None"""
+        ts = self.post_times.get(post_id)
+        return datetime.fromtimestamp(ts, tz=timezone.utc) if ts else None
+
+    def _positions(self, row_ids) -> dict:
+        """Row index of each given id (one pass, ids are not assumed to be sorted)"""
+        wanted = set(row_ids)
+        return {row_id: idx for idx, row_id in enumerate(self.ids) if row_id in wanted}
+
+    def update_points(self, changes: dict):
+        """Overwrite points for rows by id"""
+        positions = self._positions(changes)
+        for row_id, idx in positions.items():
+            self.points[idx] = changes[row_id]
+        updated = len(positions)
+        logger.info(f"✏️  Updated points for {updated}/{len(changes)} rows in the event store")
+        if updated:
+            self.reindex()
+        return updated
+
+    def resolve_ids(self, ids: dict):
+        """Replace provisional ids of spooled rows with the ids they got on replay"""
+        for token, idx in self._positions(ids).items():
+            self.ids[idx] = ids[token]
+            if ids[token] > self.last_id:
+                self.last_id = ids[token]
+
+    def post_summary(self, post_id: int) -> dict:
+        """Engagement aggregates for one post, or None if nobody engaged with it"""
+        stats = self.post_stats.get(post_id)
+        if stats is None:
+            return None
+        posted = self.post_times.get(post_id)
+        return {
+            'post_id': post_id,
+            'comments': stats.comments,
+            'reactions': stats.reactions,
+            'unique_users': len(stats.users),
+            'points': stats.points,
+            'posted_at': posted or None,
+            'first_seen': stats.first_seen,
+            'time_to_first_comment': stats.first_comment - posted if posted and stats.first_comment else None,
+        }
+
+    def top_posts(self, days: int = 7, limit: int = 10, key: str = 'points') -> list:
+        """Most engaging posts published (or first engaged with) in the window"""
+        cutoff = days_to_cutoff(days) or 0
+        post_times = self.post_times
+        recent = (
+            (post_id, stats) for post_id, stats in self.post_stats.items()
+            if post_times.get(post_id, stats.first_seen) >= cutoff
+        )
+        if key == 'unique_users':
+            top = heapq.nlargest(limit, recent, key=lambda item: len(item[1].users))
+        else:
+            top = heapq.nlargest(limit, recent, key=lambda item: getattr(item[1], key))
+        return [self.post_summary(post_id) for post_id, _ in top]
+
+    def clear(self):
+        """Drop every row (used after a season reset)"""
+        last_id, floor_id = self.last_id, self.floor_id
+        self.__init__()
+        self.last_id, self.floor_id = last_id, floor_id
+        self.loaded = True
+
+    def drop_through(self, last_id: int):
+        """Drop the rows archived by a season reset (ids up to last_id).
+
+        Rows written meanwhile, and spooled rows still under a provisional
+        (negative) id, belong to the new season and are kept.
+        """
+        self._keep([row_id < 0 or row_id > last_id for row_id in self.ids])
+        # Rows of the archived season still in flight (e.g. from scoring workers) must not come back
+        self.floor_id = max(self.floor_id, last_id)
+        self.reindex()
+
+    def drop_provisional(self, pending: set) -> int:
+        """Drop rows under a provisional id whose spool record is gone (replayed, so loaded again by id)"""
+        keep = [row_id >= 0 or row_id in pending for row_id in self.ids]
+        dropped = len(keep) - sum(keep)
+        if dropped:
+            self._keep(keep)
+            self.reindex()
+        return dropped
+
+    def _keep(self, keep: list):
+        """Keep only the rows selected by a mask, and the profiles of their users"""
+        kept = [array(column.typecode, compress(column, keep)) for column in (
+            self.ids, self.user_ids, self.types, self.points, self.timestamps, self.post_ids, self.post_timestamps)]
+        profiles, loaded = self.profiles, self.loaded
+        self.clear()
+        self.loaded = loaded
+        (self.ids, self.user_ids, self.types, self.points,
+         self.timestamps, self.post_ids, self.post_timestamps) = kept
+        self.profiles = {user_id: profiles[user_id] for user_id in set(self.user_ids) if user_id in profiles}
+
+    def _window(self, since: int = None):
+        """Return (start, mask) selecting rows with timestamp >= since"""
+        if since is None:
+            return 0, None
+        if self._sorted:
+            return bisect_left(self.timestamps, since), None
+        return 0, [ts >= since for ts in self.timestamps]
+
+    def _arrays(self, since: int = None, *columns) -> list:
+        """The given columns as numpy arrays, restricted to rows with timestamp >= since.
+
+        Each column is sliced (a copy) before wrapping it: array.append refuses
+        to grow an array whose buffer is exported, and rankings are computed in
+        a thread while the event loop keeps appending. post_timestamps is
+        appended last, so every column already holds at least that many rows.
+        """
+        end = len(self.post_timestamps)
+        start = 0
+        if since is not None and self._sorted:
+            start = bisect_left(self.timestamps, since, 0, end)
+        arrays = [np.frombuffer(column[start:end], dtype=column.typecode) for column in columns]
+        if since is not None and not self._sorted:
+            keep = np.frombuffer(self.timestamps[:end], dtype=self.timestamps.typecode) >= since
+            arrays = [values[keep] for values in arrays]
+        return arrays
+
+    @staticmethod
+    def _group_sum(keys, values) -> dict:
+        """Sum values per distinct key"""
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=values, minlength=len(unique)).astype(np.int64)
+        return dict(zip(unique.tolist(), sums.tolist()))
+
+    def totals(self, since: int = None) -> dict:
+        """Sum points per user for rows with timestamp >= since"""
+        if since is None:
+            return dict(self.user_totals)
+        user_col, points_col = self._arrays(since, self.user_ids, self.points)
+        return self._group_sum(user_col, points_col)
+
+    def type_breakdown(self, since: int = None, user_id: int = None) -> dict:
+        """Count and points per activity type, optionally for a single user"""
+        user_col, type_col, points_col = self._arrays(since, self.user_ids, self.types, self.points)
+        if user_id is not None:
+            selected = user_col == user_id
+            type_col, points_col = type_col[selected], points_col[selected]
+        counts = np.bincount(type_col, minlength=len(ACTIVITY_TYPES)).tolist()
+        sums = np.bincount(type_col, weights=points_col, minlength=len(ACTIVITY_TYPES)).astype(np.int64).tolist()
+        return {
+            ACTIVITY_TYPES[code]: {'count': counts[code], 'points': sums[code]}
+            for code in range(len(ACTIVITY_TYPES)) if counts[code]
+        }
+
+    def daily_histogram(self, since: int = None, user_id: int = None) -> dict:
+        """Points per UTC day (ISO date string), optionally for a single user"""
+        user_col, ts_col, points_col = self._arrays(since, self.user_ids, self.timestamps, self.points)
+        if user_id is not None:
+            selected = user_col == user_id
+            ts_col, points_col = ts_col[selected], points_col[selected]
+        days = self._group_sum(ts_col // SECONDS_PER_DAY, points_col)
+        return {
+            datetime.fromtimestamp(day * SECONDS_PER_DAY, tz=timezone.utc).date().isoformat(): points
+            for day, points in days.items()
+        }
+
+    def last_activity(self, user_id: int, since: int = None) -> int:
+        """Epoch seconds of the user's latest activity in the window, or None"""
+        start, mask = self._window(since)
+        for idx in range(len(self.user_ids) - 1, start - 1, -1):
+            if self.user_ids[idx] == user_id and (mask is None or mask[idx]):
+                return self.timestamps[idx]
+        return None
+
+    def last_activities(self) -> dict:
+        """Epoch seconds of every user's latest activity"""
+        user_col, ts_col = self._arrays(None, self.user_ids, self.timestamps)
+        unique, inverse = np.unique(user_col, return_inverse=True)
+        latest = np.zeros(len(unique), dtype=np.int64)
+        np.maximum.at(latest, inverse, ts_col)
+        return dict(zip(unique.tolist(), latest.tolist()))
+
+    def leaderboard(self, days: int = None, limit: int = 20) -> list:
+        """Same result shape as get_leaderboard, computed from the columns"""
+        scores = self.totals(days_to_cutoff(days))
+        if limit:
+            # Partial selection: O(n log k) instead of sorting every user to keep a few
+            ranked = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        else:
+            ranked = sorted(scores.items(), key=itemgetter(1), reverse=True)
+        result = []
+        for user_id, total_score in ranked:
+            username, first_name = self.profiles.get(user_id, (None, None))
+            result.append({
+                'user_id': user_id,
+                'username': username,
+                'first_name': first_name,
+                'total_score': total_score
+            })
+        return result
+
+
+# One store per tracked chat, so a busy group never slows down lookups for the others
+event_stores = {}
+stores_loaded = False
+
+
+def get_event_store(chat_id: int) -> EventStore:
+    """Return the event store partition for a chat, creating it on first use"""
+    store = event_stores.get(chat_id)
+    if store is None:
+        store = event_stores[chat_id] = EventStore()
+        store.loaded = stores_loaded
+    return store
+
+
+def mark_stores_loaded():
+    """Flag every partition (and partitions created later) as fully loaded"""
+    global stores_loaded
+    stores_loaded = True
+    for store in event_stores.values():
+        store.loaded = True
+
+
+def stores_last_id() -> int:
+    """Highest activity_log id applied to any partition"""
+    return max((store.last_id for store in event_stores.values()), default=0)
@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class ExpiringMap:
+    """Size-bounded mapping whose entries expire, kept in insertion order.
+
+    Setting a key moves it to the newest end, so eviction only ever pops
+    from the oldest end: entries past max_size, and the oldest entries
+    while they have expired. With one ttl for every entry that removes all
+    expired entries; an entry given a shorter ttl may stay in memory until
+    it reaches the oldest end, but reads never return it.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int = None, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.clock = clock
+        # key -> (expires, value)
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        """The live value of key, or default if it is missing or expired"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] < self.clock():
+            del self.entries[key]
+            return default
+        return entry[1]
+
+    def set(self, key, value, ttl: float = None, now: float = None):
+        """Store value as the newest entry, expiring ttl (default ttl_seconds) after now"""
+        now = self.clock() if now is None else now
+        self.entries.pop(key, None)
+        self.entries[key] = (now + (self.ttl_seconds if ttl is None else ttl), value)
+        self.evict()
+
+    def pop(self, key, default=None):
+        entry = self.entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def evict(self, now: float = None) -> int:
+        """Drop entries over the size bound and expired ones at the oldest end; returns how many"""
+        now = self.clock() if now is None else now
+        entries = self.entries
+        before = len(entries)
+        while entries and ((self.max_size is not None and len(entries) > self.max_size)
+                           or next(iter(entries.values()))[0] < now):
+            entries.popitem(last=False)
+        return before - len(entries)
+
+    def items(self) -> list:
+        """Live (key, value) pairs, oldest first"""
+        now = self.clock()
+        return [(key, value) for key, (expires, value) in self.entries.items() if expires >= now]
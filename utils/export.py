@@ -0,0 +1,129 @@
+import argparse
+import csv
+import gzip
+import logging
+import os
+
+from config import GROUP_CHAT_ID
+from utils.event_store import get_event_store
+from utils.helpers import iter_pages
+
+logger = logging.getLogger(__name__)
+
+# Export name -> source table
+EXPORT_TABLES = {
+    'activity': 'activity_log',
+    'referrals': 'referrals',
+    'archive': 'activity_log_archive',
+}
+EXPORT_FORMATS = ('csv', 'parquet')
+
+
+class _CsvSink:
+    """gzip-compressed CSV writer, header taken from the first page"""
+
+    def __init__(self, path: str):
+        self.file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        self.writer = None
+
+    def write(self, rows: list):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(rows[0]), extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetSink:
+    """Parquet writer (needs pyarrow), one row group per page"""
+
+    def __init__(self, path: str):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.path = path
+        self.writer = None
+
+    def write(self, rows: list):
+        table = self.pyarrow.Table.from_pylist(rows)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema, compression='zstd')
+        else:
+            table = table.select(self.writer.schema.names).cast(self.writer.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _open_sink(path: str, fmt: str):
+    if fmt == 'parquet':
+        return _ParquetSink(path)
+    return _CsvSink(path)
+
+
+def export_path(out_dir: str, name: str, fmt: str, chat_id: int) -> str:
+    extension = 'parquet' if fmt == 'parquet' else 'csv.gz'
+    return os.path.join(out_dir, f"{name}_{chat_id}.{extension}")
+
+
+def export_table(name: str, out_dir: str, fmt: str = 'csv', chat_id: int = GROUP_CHAT_ID, seasons=None, page_size: int = 1000) -> tuple:
+    """Stream one table to a compressed file page by page.
+
+    Only one page of rows is held in memory at a time. Returns (path, rows).
+    """
+    table = EXPORT_TABLES[name]
+    path = export_path(out_dir, name, fmt, chat_id)
+    in_ = {'season_id': seasons} if table == 'activity_log_archive' and seasons else None
+    logger.info(f"📤 Exporting {table} for chat {chat_id} to {path}")
+
+    sink = _open_sink(path, fmt)
+    rows = 0
+    try:
+        for page in iter_pages(table, '*', page_size, eq={'chat_id': chat_id}, in_=in_):
+            sink.write(page)
+            rows += len(page)
+    finally:
+        sink.close()
+
+    logger.info(f"✅ Exported {rows} rows from {table}")
+    return path, rows
+
+
+def export_leaderboard(out_dir: str, fmt: str = 'csv', chat_id: int = GROUP_CHAT_ID, days: int = None) -> tuple:
+    """Write a chat's leaderboard for a window from its in-memory event store"""
+    path = export_path(out_dir, f"leaderboard_{days or 'all'}", fmt, chat_id)
+    ranking = get_event_store(chat_id).leaderboard(days=days, limit=None)
+    rows = [{'rank': idx + 1, **entry} for idx, entry in enumerate(ranking)]
+
+    sink = _open_sink(path, fmt)
+    try:
+        if rows:
+            sink.write(rows)
+    finally:
+        sink.close()
+
+    logger.info(f"✅ Exported leaderboard with {len(rows)} users")
+    return path, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export activity data to compressed CSV or Parquet")
+    parser.add_argument('name', choices=sorted(EXPORT_TABLES), help="what to export")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--chat', type=int, default=GROUP_CHAT_ID, help="chat to export")
+    parser.add_argument('--season', action='append', dest='seasons', help="archived season (season_id) to export")
+    parser.add_argument('--out', default='.', help="output directory")
+    args = parser.parse_args()
+
+    path, rows = export_table(args.name, args.out, args.format, args.chat, args.seasons)
+    print(f"{rows} rows written to {path}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    main()
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+
+from config import GROUP_CHAT_ID, CHANNEL_USERNAME, ADMIN_USER_ID_EU, GROUPS_CONFIG_FILE
+
+logger = logging.getLogger(__name__)
+
+# Settings every group gets unless its entry in the groups file overrides them
+DEFAULT_GROUP_SETTINGS = {
+    'channel_username': CHANNEL_USERNAME,
+    'admin_user_id': ADMIN_USER_ID_EU,
+}
+
+# Texts of the main group, the one GROUP_CHAT_ID points at
+MAIN_GROUP_SETTINGS = {
+    'title': "🇩🇪 Yevropalik o'zbek",
+    'about': "Germaniyaga kelganlar va kelmoqchi bo'lganlar uchun",
+    'topics': [
+        "O'qish va grant imkoniyatlari",
+        "Ish topish yo'llari",
+        "Immigratsiya masalalari",
+        "Hayot haqida foydali ma'lumotlar",
+        "Hammasi oddiy va tushunarli tilda!",
+    ],
+}
+
+groups = {}
+
+
+def load_groups(path: str = GROUPS_CONFIG_FILE) -> dict:
+    """(Re)load per-group settings, keyed by chat_id.
+
+    The groups file is a JSON list of objects with at least "chat_id" and
+    optionally "channel_username", "admin_user_id", "title" (defaults to the
+    channel), "about" and "topics" (the channel pitch shown to invited users).
+    GROUP_CHAT_ID is always tracked. The registry is updated in place so that modules holding
+    a reference keep seeing the current groups.
+    """
+    loaded = {GROUP_CHAT_ID: {'chat_id': GROUP_CHAT_ID, **DEFAULT_GROUP_SETTINGS, **MAIN_GROUP_SETTINGS}}
+
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                for entry in json.load(f):
+                    chat_id = int(entry['chat_id'])
+                    base = MAIN_GROUP_SETTINGS if chat_id == GROUP_CHAT_ID else {}
+                    group = loaded[chat_id] = {**DEFAULT_GROUP_SETTINGS, **base, **entry, 'chat_id': chat_id}
+                    group.setdefault('title', f"@{group['channel_username']}")
+        except Exception as e:
+            logger.error(f"❌ Error reading groups from {path}, keeping previous groups: {e}")
+            return groups
+
+    groups.clear()
+    groups.update(loaded)
+    logger.info(f"👥 Tracking {len(groups)} group(s): {sorted(groups)}")
+    return groups
+
+
+def get_group(chat_id: int) -> dict:
+    """Settings for a tracked group, or None if the chat is not tracked"""
+    return groups.get(chat_id)
+
+
+def group_or_default(chat_id: int) -> dict:
+    """Settings for a tracked group, falling back to the main group"""
+    return groups.get(chat_id) or groups[GROUP_CHAT_ID]
+
+
+def is_group_admin(user_id: int, chat_id: int) -> bool:
+    """Whether the user administers the bot for this group (the main admin administers all)"""
+    if user_id == ADMIN_USER_ID_EU:
+        return True
+    group = groups.get(chat_id)
+    return bool(group) and group.get('admin_user_id') == user_id
+
+
+def resolve_chat_id(update, args: list = None) -> int:
+    """Pick the group a command refers to.
+
+    Inside a tracked group that group is used. In a private chat the first
+    command argument may name a tracked chat_id (it is removed from args),
+    otherwise the default GROUP_CHAT_ID is used.
+    """
+    chat = update.effective_chat
+    if chat and chat.id in groups:
+        return chat.id
+    if args:
+        try:
+            chat_id = int(args[0])
+        except ValueError:
+            return GROUP_CHAT_ID
+        if chat_id in groups:
+            args.pop(0)
+            return chat_id
+    return GROUP_CHAT_ID
+
+
+load_groups()
@@ -1,48 +1,37 @@
+import heapq
 import logging
 from datetime import datetime, timedelta, timezone
-from config import (
-    supabase, 
-    POINTS_FOR_COMMENT_EARLY, 
-    POINTS_FOR_COMMENT_LATE,
-    POINTS_FOR_REACTION_EARLY,
-    POINTS_FOR_REACTION_LATE,
-    EARLY_WINDOW_HOURS
-)
+from config import supabase, GROUP_CHAT_ID
 from telegram.ext import ContextTypes
+from utils.event_store import event_stores, get_event_store, mark_stores_loaded, stores_last_id
+from utils.groups import get_group
+from utils.workers import partition_for, worker_pool
+from utils.spool import insert_or_spool, storage_breaker
+from utils.scoring import scoring_rules
 
 logger = logging.getLogger(__name__)
 
 
-def calculate_points(activity_type: str, post_timestamp: datetime) -> int:
-    """Calculate points based on activity type and time since post"""
+def calculate_points(activity_type: str, post_timestamp: datetime, position: int = None) -> int:
+    """Calculate points based on activity type, time since post and comment position"""
     logger.info(f"📊 Calculating points for activity_type='{activity_type}'")
     
     now = datetime.now(timezone.utc)
-    time_diff = now - post_timestamp
-    hours_elapsed = time_diff.total_seconds() / 3600
-    is_early = hours_elapsed < EARLY_WINDOW_HOURS
+    age_seconds = (now - post_timestamp).total_seconds() if post_timestamp else 0
     
-    logger.info(f"⏱️  Time since post: {hours_elapsed:.2f} hours (Early: {is_early})")
+    logger.info(f"⏱️  Time since post: {age_seconds / 3600:.2f} hours")
     
-    if activity_type == 'comment':
-        points = POINTS_FOR_COMMENT_EARLY if is_early else POINTS_FOR_COMMENT_LATE
-        logger.info(f"💬 Comment points awarded: {points}")
-        return points
-    elif activity_type == 'reaction':
-        points = POINTS_FOR_REACTION_EARLY if is_early else POINTS_FOR_REACTION_LATE
-        logger.info(f"❤️  Reaction points awarded: {points}")
-        return points
-    
-    logger.warning(f"⚠️  Unknown activity type: {activity_type}, returning 0 points")
-    return 0
+    points = scoring_rules.points(activity_type, age_seconds, position)
+    logger.info(f"🎯 {activity_type} points awarded: {points}")
+    return points
 
 
-def has_user_commented_on_post(user_id: int, post_id: int) -> bool:
+def has_user_commented_on_post(user_id: int, post_id: int, chat_id: int = GROUP_CHAT_ID) -> bool:
     """Check if user has already commented on this post"""
     logger.info(f"🔍 Checking if user {user_id} already commented on post {post_id}")
     
     try:
-        result = supabase.table('activity_log').select('id').eq('user_id', user_id).eq('post_id', post_id).eq('activity_type', 'comment').execute()
+        result = supabase.table('activity_log').select('id').eq('chat_id', chat_id).eq('user_id', user_id).eq('post_id', post_id).eq('activity_type', 'comment').execute()
         has_commented = len(result.data) > 0
         
         if has_commented:
@@ -56,20 +45,20 @@ def has_user_commented_on_post(user_id: int, post_id: int) -> bool:
         return False
 
 
-def log_activity(user_id: int, username: str, first_name: str, activity_type: str, points: int, post_id: int = None, post_timestamp: datetime = None):
-    """Log user activity to Supabase"""
+def log_activity(user_id: int, username: str, first_name: str, activity_type: str, points: int, post_id: int = None, post_timestamp: datetime = None, chat_id: int = GROUP_CHAT_ID):
+    """Log user activity to Supabase, returning the inserted (or spooled) row, None on failure"""
     display_name = f"@{username}" if username else (first_name or f"User {user_id}")
-    logger.info(f"📝 Logging activity for user: {display_name} (ID: {user_id})")
+    logger.info(f"📝 Logging activity for user: {display_name} (ID: {user_id}) in chat {chat_id}")
     logger.info(f"   Type: {activity_type}, Points: {points}, Post ID: {post_id}")
     
     try:
         timestamp = datetime.now(timezone.utc).isoformat()
         
         # For referral activities, ensure we fetch the referrer's info from database
-        if activity_type == 'referral' and (not username or not first_name):
+        if activity_type == 'referral' and (not username or not first_name) and storage_breaker.closed:
             try:
                 # Try to get user info from existing activity_log
-                existing_user = supabase.table('activity_log').select('username, first_name').eq('user_id', user_id).limit(1).execute()
+                existing_user = supabase.table('activity_log').select('username, first_name').eq('chat_id', chat_id).eq('user_id', user_id).limit(1).execute()
                 if existing_user.data:
                     username = existing_user.data[0].get('username') or username
                     first_name = existing_user.data[0].get('first_name') or first_name
@@ -78,6 +67,7 @@ def log_activity(user_id: int, username: str, first_name: str, activity_type: st
                 logger.warning(f"⚠️ Could not retrieve existing user info: {e}")
         
         data = {
+            'chat_id': chat_id,
             'user_id': user_id,
             'username': username,
             'first_name': first_name,
@@ -89,20 +79,30 @@ def log_activity(user_id: int, username: str, first_name: str, activity_type: st
         }
         
         logger.info(f"💾 Inserting into Supabase: {data}")
-        result = supabase.table('activity_log').insert(data).execute()
-        logger.info(f"✅ Successfully logged {activity_type} for {display_name} worth {points} points. Row ID: {result.data[0].get('id') if result.data else 'N/A'}")
+        row = insert_or_spool('activity_log', data)
+        logger.info(f"✅ Successfully logged {activity_type} for {display_name} worth {points} points. Row ID: {row['id'] if row['id'] > 0 else 'spooled'}")
+        # Spooled rows count in memory right away under a provisional id, replaced on replay
+        store = get_event_store(chat_id)
+        if store.loaded:
+            store.append_row(row)
+        return row
     except Exception as e:
         logger.error(f"❌ Error logging activity to Supabase: {e}")
         logger.error(f"❌ Failed data: user_id={user_id}, activity_type={activity_type}, points={points}")
+        return None
 
         
-def get_leaderboard(days: int = None, limit: int = 20):
+def get_leaderboard(days: int = None, limit: int = 20, chat_id: int = GROUP_CHAT_ID):
     """Get leaderboard from Supabase"""
     period_desc = f"last {days} days" if days else "all time"
-    logger.info(f"🏆 Fetching leaderboard for {period_desc} (limit: {limit if limit else 'all'})")
+    logger.info(f"🏆 Fetching leaderboard for {period_desc} in chat {chat_id} (limit: {limit if limit else 'all'})")
     
+    store = get_event_store(chat_id)
+    if store.loaded:
+        return store.leaderboard(days=days, limit=limit)
+
     try:
-        query = supabase.table('activity_log').select('user_id, username, first_name, points')
+        query = supabase.table('activity_log').select('user_id, username, first_name, points').eq('chat_id', chat_id)
         
         if days:
             cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
@@ -126,23 +126,97 @@ def get_leaderboard(days: int = None, limit: int = 20):
         
         logger.info(f"👥 Aggregated scores for {len(user_scores)} unique users")
         
-        # Sort by score
-        sorted_users = sorted(user_scores.values(), key=lambda x: x['total_score'], reverse=True)
-        
-        # Apply limit if specified
+        # Apply limit if specified, selecting the top users without sorting everyone
         if limit:
-            sorted_users = sorted_users[:limit]
+            sorted_users = heapq.nlargest(limit, user_scores.values(), key=lambda x: x['total_score'])
             logger.info(f"📊 Top {len(sorted_users)} users selected for leaderboard")
+        else:
+            sorted_users = sorted(user_scores.values(), key=lambda x: x['total_score'], reverse=True)
         
         return sorted_users
     except Exception as e:
         logger.error(f"❌ Error fetching leaderboard: {e}")
         return []
+
+
+def iter_pages(table: str, columns: str = '*', page_size: int = 1000, eq: dict = None, in_: dict = None):
+    """Yield pages of a table in id order using keyset pagination, so memory stays bounded by one page"""
+    last_id = 0
+    while True:
+        query = supabase.table(table).select(columns).gt('id', last_id)
+        for column, value in (eq or {}).items():
+            query = query.eq(column, value)
+        for column, values in (in_ or {}).items():
+            query = query.in_(column, list(values))
+        result = query.order('id').limit(page_size).execute()
+
+        if result.data:
+            yield result.data
+        if len(result.data) < page_size:
+            return
+        last_id = result.data[-1]['id']
+
+
+def load_event_store(page_size: int = 1000, partition: tuple = None):
+    """Fill the per-chat event stores from activity_log, paging by id.
+
+    partition=(index, count) keeps only the posts owned by one scoring worker.
+    """
+    last_id = stores_last_id()
+    logger.info(f"📥 Loading activity_log into the event stores (after id {last_id})")
+    loaded = 0
+
+    try:
+        while True:
+            result = supabase.table('activity_log')\
+                .select('id, chat_id, user_id, username, first_name, activity_type, points, timestamp, post_id, post_timestamp')\
+                .gt('id', last_id)\
+                .order('id')\
+                .limit(page_size)\
+                .execute()
+
+            for row in result.data:
+                # Rows written before multi-group support belong to the default group
+                chat_id = row.get('chat_id') or GROUP_CHAT_ID
+                if partition and partition_for(chat_id, row.get('post_id'), partition[1]) != partition[0]:
+                    continue
+                get_event_store(chat_id).append_row(row)
+            loaded += len(result.data)
+
+            if len(result.data) < page_size:
+                break
+            last_id = result.data[-1]['id']
+
+        mark_stores_loaded()
+        total = sum(len(store) for store in event_stores.values())
+        logger.info(f"✅ Event stores ready: {loaded} rows loaded, {total} total in {len(event_stores)} chat(s)")
+    except Exception as e:
+        logger.error(f"❌ Error loading event stores, falling back to database queries: {e}")
     
 
-def generate_referral_link(user_id: int, bot_username: str) -> str:
+def apply_replayed_rows(table: str, rows: list, tokens: list = None):
+    """Swap the provisional ids of replayed rows (already counted when spooled) for their real ids"""
+    if table != 'activity_log':
+        return
+    resolved = {}
+    for row, token in zip(rows, tokens or [None] * len(rows)):
+        chat_id = row.get('chat_id') or GROUP_CHAT_ID
+        if token:
+            resolved.setdefault(chat_id, {})[token] = row['id']
+        store = get_event_store(chat_id)
+        if row.get('id', 0) > store.last_id:
+            store.last_id = row['id']
+    for chat_id, ids in resolved.items():
+        get_event_store(chat_id).resolve_ids(ids)
+        if worker_pool.running:
+            worker_pool.broadcast({'kind': 'resolve_ids', 'chat_id': chat_id, 'ids': ids})
+
+
+def generate_referral_link(user_id: int, bot_username: str, chat_id: int = GROUP_CHAT_ID) -> str:
     """Generate a unique referral link for user"""
-    return f"https://t.me/{bot_username}?start=ref_{user_id}"
+    if chat_id == GROUP_CHAT_ID:
+        return f"https://t.me/{bot_username}?start=ref_{user_id}"
+    return f"https://t.me/{bot_username}?start=ref_{user_id}_{chat_id}"
 
 def get_referrer_from_payload(payload: str) -> int:
     """Extract referrer user_id from start payload"""
@@ -153,36 +227,48 @@ def get_referrer_from_payload(payload: str) -> int:
             return None
     return None
 
-def has_user_joined_before(user_id: int) -> bool:
+def get_referral_chat_from_payload(payload: str) -> int:
+    """Extract the group a referral link belongs to, defaulting to GROUP_CHAT_ID"""
+    parts = payload.split('_') if payload else []
+    if len(parts) > 2:
+        try:
+            chat_id = int(parts[2])
+            if get_group(chat_id):
+                return chat_id
+        except ValueError:
+            pass
+    return GROUP_CHAT_ID
+
+def has_user_joined_before(user_id: int, chat_id: int = GROUP_CHAT_ID) -> bool:
     """Check if user has already joined via referral"""
     try:
-        result = supabase.table('referrals').select('id').eq('referred_user_id', user_id).execute()
+        result = supabase.table('referrals').select('id').eq('chat_id', chat_id).eq('referred_user_id', user_id).execute()
         return len(result.data) > 0
     except Exception as e:
         logger.error(f"❌ Error checking referral status: {e}")
         return False
 
-def log_referral(referrer_id: int, referred_user_id: int, referred_username: str, referred_first_name: str):
+def log_referral(referrer_id: int, referred_user_id: int, referred_username: str, referred_first_name: str, chat_id: int = GROUP_CHAT_ID):
     """Log referral to database"""
     try:
         timestamp = datetime.now(timezone.utc).isoformat()
         data = {
+            'chat_id': chat_id,
             'referrer_id': referrer_id,
             'referred_user_id': referred_user_id,
             'referred_username': referred_username,
             'referred_first_name': referred_first_name,
             'timestamp': timestamp
         }
-        supabase.table('referrals').insert(data).execute()
-        logger.info(f"✅ Referral logged: {referrer_id} -> {referred_user_id}")
+        insert_or_spool('referrals', data)
+        logger.info(f"✅ Referral logged: {referrer_id} -> {referred_user_id} in chat {chat_id}")
     except Exception as e:
         logger.error(f"❌ Error logging referral: {e}")
 
-async def check_channel_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    """Check if user is member of the channel"""
+async def check_channel_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE, chat_id: int = GROUP_CHAT_ID) -> bool:
+    """Check if user is member of the group's channel"""
     try:
-        from config import CHANNEL_USERNAME
-        channel_id = f"@{CHANNEL_USERNAME}"
+        channel_id = f"@{get_group(chat_id)['channel_username']}"
         
         member = await context.bot.get_chat_member(chat_id=channel_id, user_id=user_id)
         is_member = member.status in ['member', 'administrator', 'creator']
@@ -191,4 +277,4 @@ async def check_channel_membership(user_id: int, context: ContextTypes.DEFAULT_T
         return is_member
     except Exception as e:
         logger.error(f"❌ Error checking channel membership: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,168 @@
+import copy
+import threading
+import time
+
+
+class MemoryResult:
+    """Result of an executed query, shaped like the PostgREST response"""
+
+    def __init__(self, data: list):
+        self.data = data
+        self.count = len(data)
+
+
+class MemoryQuery:
+    """Chainable query over one in-memory table.
+
+    Implements the subset of the PostgREST query builder the bot uses:
+    select/insert/upsert/update/delete with eq, neq, gt, gte, lt, lte, in_,
+    order and limit.
+    """
+
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.columns = None
+        self.payload = None
+        self.filters = []
+        self.order_by = None
+        self.max_rows = None
+        self.conflict_column = 'id'
+
+    def select(self, columns: str = '*', count: str = None):
+        self.action = 'select'
+        self.columns = None if columns.strip() == '*' else [column.strip() for column in columns.split(',')]
+        return self
+
+    def insert(self, data):
+        self.action = 'insert'
+        self.payload = data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict: str = 'id'):
+        self.action = 'upsert'
+        self.payload = data if isinstance(data, list) else [data]
+        self.conflict_column = on_conflict
+        return self
+
+    def update(self, data: dict):
+        self.action = 'update'
+        self.payload = data
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def _filter(self, column: str, test):
+        self.filters.append((column, test))
+        return self
+
+    def eq(self, column: str, value):
+        return self._filter(column, lambda v: v == value)
+
+    def neq(self, column: str, value):
+        return self._filter(column, lambda v: v != value)
+
+    def gt(self, column: str, value):
+        return self._filter(column, lambda v: v is not None and v > value)
+
+    def gte(self, column: str, value):
+        return self._filter(column, lambda v: v is not None and v >= value)
+
+    def lt(self, column: str, value):
+        return self._filter(column, lambda v: v is not None and v < value)
+
+    def lte(self, column: str, value):
+        return self._filter(column, lambda v: v is not None and v <= value)
+
+    def in_(self, column: str, values):
+        values = set(values)
+        return self._filter(column, lambda v: v in values)
+
+    def order(self, column: str, desc: bool = False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count: int):
+        self.max_rows = count
+        return self
+
+    def _matches(self, row: dict) -> bool:
+        return all(test(row.get(column)) for column, test in self.filters)
+
+    def execute(self) -> MemoryResult:
+        if self.client.latency:
+            time.sleep(self.client.latency)
+        with self.client.lock:
+            self.client.calls += 1
+            rows = self.client.tables.setdefault(self.table, [])
+
+            if self.action == 'insert':
+                inserted = []
+                for data in self.payload:
+                    self.client.last_id += 1
+                    row = {'id': self.client.last_id, **copy.deepcopy(data)}
+                    rows.append(row)
+                    inserted.append(dict(row))
+                return MemoryResult(inserted)
+
+            if self.action == 'upsert':
+                stored = []
+                for data in self.payload:
+                    key = data.get(self.conflict_column)
+                    row = next((row for row in rows if key is not None and row.get(self.conflict_column) == key), None)
+                    if row is None:
+                        self.client.last_id += 1
+                        row = {'id': self.client.last_id}
+                        rows.append(row)
+                    row.update(copy.deepcopy(data))
+                    stored.append(dict(row))
+                return MemoryResult(stored)
+
+            if self.action == 'delete':
+                kept = [row for row in rows if not self._matches(row)]
+                deleted = [row for row in rows if self._matches(row)]
+                self.client.tables[self.table] = kept
+                return MemoryResult(deleted)
+
+            matched = [row for row in rows if self._matches(row)]
+            if self.action == 'update':
+                for row in matched:
+                    row.update(self.payload)
+                return MemoryResult([dict(row) for row in matched])
+
+            if self.order_by:
+                column, desc = self.order_by
+                matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            if self.max_rows is not None:
+                matched = matched[:self.max_rows]
+            if self.columns:
+                return MemoryResult([{column: row.get(column) for column in self.columns} for row in matched])
+            return MemoryResult([dict(row) for row in matched])
+
+
+class MemoryClient:
+    """In-process stand-in for the Supabase client (STORAGE_BACKEND=memory).
+
+    Tables are plain lists of dicts, ids come from one shared sequence.
+    latency (seconds) is slept on every call to imitate a remote backend;
+    like the real client the call blocks the caller.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.tables = {}
+        self.latency = latency
+        self.last_id = 0
+        self.calls = 0
+        self.rpc_calls = []
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self, name)
+
+    def rpc(self, name: str, params: dict = None) -> MemoryQuery:
+        """Database functions have no effect here (tables are created on first use)"""
+        self.rpc_calls.append((name, params))
+        return MemoryQuery(self, f"rpc:{name}")
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from config import (
+    supabase,
+    NAME_RESOLVE_CONCURRENCY,
+    NAME_RESOLVE_TIMEOUT,
+    NAME_CACHE_TTL_SECONDS,
+    NAME_NEGATIVE_TTL_SECONDS,
+    NAME_CACHE_MAX
+)
+from utils.event_store import event_stores
+from utils.expiring import ExpiringMap
+
+logger = logging.getLogger(__name__)
+
+PROFILES_TABLE = 'user_profiles'
+
+
+class NameResolver:
+    """Resolves display names of users whose activity rows carry none.
+
+    Lookups go through a shared cache first, then the user_profiles table
+    (one query for all missing users), and only then Telegram. The Telegram
+    calls run concurrently, at most `concurrency` at a time and each bounded
+    by `timeout`. Users that cannot be fetched are cached as misses for
+    `negative_ttl` seconds so they are not retried on every render. Names
+    found on Telegram are written back with one upsert.
+    """
+
+    def __init__(self, concurrency: int, timeout: float, ttl_seconds: int, negative_ttl: int, max_size: int):
+        self.timeout = timeout
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl = negative_ttl
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # user_id -> (username, first_name); a miss is (None, None)
+        self.cache = ExpiringMap(ttl_seconds, max_size)
+
+    def _remember(self, user_id: int, username: str, first_name: str, ttl: int):
+        self.cache.set(user_id, (username, first_name), ttl=ttl)
+
+    def _cached(self, user_id: int):
+        return self.cache.get(user_id)
+
+    def cached_names(self, user_ids) -> dict:
+        """Names of the given users known to the cache, without any storage or Telegram call"""
+        names = {}
+        for user_id in user_ids:
+            entry = self._cached(user_id)
+            if entry and (entry[0] or entry[1]):
+                names[user_id] = entry
+        return names
+
+    def _load_stored(self, user_ids: list):
+        try:
+            result = supabase.table(PROFILES_TABLE).select('user_id, username, first_name').in_('user_id', user_ids).execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read stored user names: {e}")
+            return
+        for row in result.data:
+            if row.get('username') or row.get('first_name'):
+                self._remember(row['user_id'], row.get('username'), row.get('first_name'), self.ttl_seconds)
+
+    async def _fetch(self, bot, user_id: int):
+        async with self.semaphore:
+            try:
+                chat = await asyncio.wait_for(bot.get_chat(user_id), self.timeout)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not fetch user info for {user_id}: {str(e) or type(e).__name__}")
+                self._remember(user_id, None, None, self.negative_ttl)
+                return None
+        self._remember(user_id, chat.username, chat.first_name, self.ttl_seconds)
+        logger.info(f"🔄 Fetched missing user info for {user_id}: {chat.first_name} (@{chat.username})")
+        return {'user_id': user_id, 'username': chat.username, 'first_name': chat.first_name}
+
+    def _write_back(self, profiles: list):
+        for profile in profiles:
+            names = (profile['username'], profile['first_name'])
+            for partition in event_stores.values():
+                if profile['user_id'] in partition.profiles:
+                    partition.profiles[profile['user_id']] = names
+        try:
+            supabase.table(PROFILES_TABLE).upsert(profiles, on_conflict='user_id').execute()
+            logger.info(f"✅ Stored names of {len(profiles)} users")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not store user names: {e}")
+
+    async def resolve(self, bot, user_ids) -> dict:
+        """Names for the given users as {user_id: (username, first_name)}, unresolvable users left out"""
+        user_ids = list(dict.fromkeys(user_ids))
+        missing = [user_id for user_id in user_ids if self._cached(user_id) is None]
+        if missing:
+            self._load_stored(missing)
+            missing = [user_id for user_id in missing if self._cached(user_id) is None]
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch(bot, user_id) for user_id in missing))
+            profiles = [profile for profile in fetched if profile]
+            if profiles:
+                self._write_back(profiles)
+
+        return self.cached_names(user_ids)
+
+
+name_resolver = NameResolver(
+    NAME_RESOLVE_CONCURRENCY, NAME_RESOLVE_TIMEOUT, NAME_CACHE_TTL_SECONDS, NAME_NEGATIVE_TTL_SECONDS, NAME_CACHE_MAX
+)
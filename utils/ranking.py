@@ -0,0 +1,164 @@
+import logging
+import secrets
+import time
+from collections import OrderedDict
+
+from config import (
+    RANKING_SNAPSHOTS_PER_CHAT,
+    RANKING_SNAPSHOT_IDLE_SECONDS,
+    RANKING_SNAPSHOT_TTL_SECONDS,
+    RANKING_REFRESH_SECONDS
+)
+from utils.event_store import get_event_store
+from utils.groups import groups
+from utils.helpers import get_leaderboard
+from utils.names import name_resolver
+
+logger = logging.getLogger(__name__)
+
+# Windows offered by the leaderboard, in days (0 = all time)
+LEADERBOARD_WINDOWS = (7, 14, 0)
+
+
+class RankingSnapshot:
+    """Frozen rankings of one chat for every leaderboard window.
+
+    Built once, then every page, window switch and position lookup is served
+    from it, so paging costs no queries and the order cannot shift under a
+    user who is browsing while new points come in. Rankings hold compact
+    (user_id, total_score) tuples; display names are kept once per user
+    beside them, filled in when it is registered (from the name cache) and
+    by the ranking job (from storage and Telegram), never while a page is
+    rendered.
+    """
+
+    def __init__(self, chat_id: int, rankings: dict, names: dict, last_activity: dict):
+        self.snapshot_id = secrets.token_hex(4)
+        self.chat_id = chat_id
+        self.created = time.time()
+        # Last time a page was served from it, older snapshots are kept while they are being browsed
+        self.browsed = 0
+        self.rankings = rankings
+        # user_id -> (username, first_name), only for users with a known name
+        self.names = names
+        self.last_activity = last_activity
+        self._positions = {}
+
+    def ranking(self, days: int) -> tuple:
+        return self.rankings.get(days, ())
+
+    def entries(self, ranked) -> list:
+        """Leaderboard dicts, as get_leaderboard returns them, for a slice of a ranking"""
+        result = []
+        for user_id, total_score in ranked:
+            username, first_name = self.names.get(user_id, (None, None))
+            result.append({
+                'user_id': user_id,
+                'username': username,
+                'first_name': first_name,
+                'total_score': total_score
+            })
+        return result
+
+    def top(self, days: int, size: int) -> list:
+        return self.entries(self.ranking(days)[:size])
+
+    def page(self, days: int, page: int, page_size: int) -> tuple:
+        """(entries, first_rank, page_count) for a page of a window, page clamped to range"""
+        self.browsed = time.time()
+        ranking = self.ranking(days)
+        page_count = max(1, -(-len(ranking) // page_size))
+        page = min(max(page, 0), page_count - 1)
+        start = page * page_size
+        return self.entries(ranking[start:start + page_size]), start + 1, page_count
+
+    def missing_names(self) -> list:
+        """Users ranked in any window without a stored name"""
+        names = self.names
+        return list(dict.fromkeys(
+            user_id for ranking in self.rankings.values() for user_id, _ in ranking if user_id not in names
+        ))
+
+    def fill_names(self, names: dict):
+        """Record {user_id: (username, first_name)} for the users of every window"""
+        self.names.update(names)
+
+    def position(self, user_id: int, days: int) -> tuple:
+        """(rank, score) of a user in a window, or (None, 0)"""
+        positions = self._positions.get(days)
+        if positions is None:
+            positions = self._positions[days] = {
+                ranked_id: (idx + 1, total_score) for idx, (ranked_id, total_score) in enumerate(self.ranking(days))
+            }
+        return positions.get(user_id, (None, 0))
+
+
+snapshots = OrderedDict()
+# Most recent snapshot per chat, refreshed by the scheduled ranking job
+latest = {}
+
+
+def rank_chat(chat_id: int, windows: tuple = LEADERBOARD_WINDOWS) -> RankingSnapshot:
+    """Rank every window of a chat once, without registering the result (safe to run in a thread)"""
+    rankings = {}
+    names = {}
+    for days in windows:
+        board = get_leaderboard(days=days or None, limit=None, chat_id=chat_id)
+        rankings[days] = tuple((entry['user_id'], entry['total_score']) for entry in board)
+        for entry in board:
+            if entry.get('username') or entry.get('first_name'):
+                names[entry['user_id']] = (entry.get('username'), entry.get('first_name'))
+
+    store = get_event_store(chat_id)
+    last_activity = store.last_activities() if store.loaded else {}
+    return RankingSnapshot(chat_id, rankings, names, last_activity)
+
+
+def _prune(now: float):
+    """Keep each chat's newest snapshots and older ones still being browsed"""
+    kept = {}
+    for snapshot in reversed(list(snapshots.values())):
+        count = kept.get(snapshot.chat_id, 0)
+        if count < RANKING_SNAPSHOTS_PER_CHAT:
+            kept[snapshot.chat_id] = count + 1
+        elif (now - snapshot.browsed > RANKING_SNAPSHOT_IDLE_SECONDS
+              or now - snapshot.created > RANKING_SNAPSHOT_TTL_SECONDS):
+            del snapshots[snapshot.snapshot_id]
+
+
+def register_snapshot(snapshot: RankingSnapshot) -> RankingSnapshot:
+    """Fill cached names into a snapshot and make it the chat's latest"""
+    snapshot.fill_names(name_resolver.cached_names(snapshot.missing_names()))
+    snapshots[snapshot.snapshot_id] = snapshot
+    latest[snapshot.chat_id] = snapshot
+    _prune(snapshot.created)
+
+    sizes = ', '.join(f"{days or 'all'}={len(ranking)}" for days, ranking in snapshot.rankings.items())
+    logger.info(f"📸 Ranking snapshot {snapshot.snapshot_id} for chat {snapshot.chat_id}: {sizes}")
+    return snapshot
+
+
+def build_snapshot(chat_id: int, windows: tuple = LEADERBOARD_WINDOWS) -> RankingSnapshot:
+    """Rank every window of a chat once and register the result"""
+    return register_snapshot(rank_chat(chat_id, windows))
+
+
+def get_snapshot(snapshot_id: str) -> RankingSnapshot:
+    """A registered snapshot that has not expired, or None"""
+    snapshot = snapshots.get(snapshot_id)
+    if snapshot is None or time.time() - snapshot.created > RANKING_SNAPSHOT_TTL_SECONDS:
+        return None
+    return snapshot
+
+
+def latest_snapshot(chat_id: int) -> RankingSnapshot:
+    """The chat's precomputed snapshot, built on the spot only if none is recent enough"""
+    snapshot = latest.get(chat_id)
+    if snapshot is None or time.time() - snapshot.created > 2 * RANKING_REFRESH_SECONDS:
+        return build_snapshot(chat_id)
+    return snapshot
+
+
+def precompute_rankings() -> list:
+    """Rank every tracked group (run in a thread by the ranking job, which registers the results)"""
+    return [rank_chat(chat_id) for chat_id in list(groups)]
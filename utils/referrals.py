@@ -0,0 +1,92 @@
+import logging
+import time
+
+from config import supabase, PENDING_REFERRAL_TTL_SECONDS, PENDING_REFERRAL_MAX, PENDING_REFERRAL_PERSIST
+from utils.expiring import ExpiringMap
+
+logger = logging.getLogger(__name__)
+
+PENDING_TABLE = 'pending_referrals'
+
+
+class PendingReferralStore:
+    """Referrals waiting for the invited user to join the channel.
+
+    One compact (referrer_id, chat_id, created) tuple per invited user in an
+    ExpiringMap, so a lookup is a single dict access. With persist=True the
+    records are also written to the pending_referrals table (user_id,
+    referrer_id, chat_id, created), so a restart between /start and the
+    subscription check does not lose the referral; a record read back from
+    the table is cached again.
+    """
+
+    def __init__(self, ttl_seconds: int, max_size: int, persist: bool = False):
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self.records = ExpiringMap(ttl_seconds, max_size)
+
+    def __len__(self):
+        return len(self.records)
+
+    def put(self, user_id: int, referrer_id: int, chat_id: int):
+        """Remember (or replace) the pending referral of an invited user"""
+        now = int(time.time())
+        self.records.set(user_id, (referrer_id, chat_id, now), now=now)
+        if self.persist:
+            try:
+                supabase.table(PENDING_TABLE).upsert(
+                    {'user_id': user_id, 'referrer_id': referrer_id, 'chat_id': chat_id, 'created': now},
+                    on_conflict='user_id'
+                ).execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not persist pending referral of {user_id}: {e}")
+
+    def get(self, user_id: int) -> dict:
+        """The user's pending referral as {'referrer_id', 'chat_id'}, or None if there is none or it expired"""
+        record = self.records.get(user_id)
+        if record is None and self.persist:
+            record = self._fetch(user_id)
+            if record is None:
+                return None
+            if record[2] < time.time() - self.ttl_seconds:
+                self.pop(user_id)
+                return None
+            self.records.set(user_id, record, now=record[2])
+        if record is None:
+            return None
+        return {'referrer_id': record[0], 'chat_id': record[1]}
+
+    def _fetch(self, user_id: int) -> tuple:
+        try:
+            result = supabase.table(PENDING_TABLE).select('referrer_id, chat_id, created').eq('user_id', user_id).limit(1).execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read pending referral of {user_id}: {e}")
+            return None
+        if not result.data:
+            return None
+        row = result.data[0]
+        return row['referrer_id'], row['chat_id'], row['created']
+
+    def pop(self, user_id: int):
+        """Forget a pending referral once it is resolved"""
+        self.records.pop(user_id, None)
+        if self.persist:
+            try:
+                supabase.table(PENDING_TABLE).delete().eq('user_id', user_id).execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not delete pending referral of {user_id}: {e}")
+
+    def purge(self):
+        """Drop expired records, including persisted ones (run from the checkpoint job)"""
+        now = time.time()
+        expired = self.records.evict(now)
+        if self.persist:
+            try:
+                supabase.table(PENDING_TABLE).delete().lt('created', int(now - self.ttl_seconds)).execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not purge expired pending referrals: {e}")
+        if expired:
+            logger.info(f"🧹 Expired {expired} pending referrals, {len(self.records)} left")
+
+
+pending_referrals = PendingReferralStore(PENDING_REFERRAL_TTL_SECONDS, PENDING_REFERRAL_MAX, PENDING_REFERRAL_PERSIST)
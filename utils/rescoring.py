@@ -0,0 +1,208 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from config import supabase, GROUP_CHAT_ID, SNAPSHOT_PATH
+from utils.event_store import parse_timestamp
+from utils.helpers import iter_pages
+from utils.scoring import ScoringRules, scoring_rules
+
+logger = logging.getLogger(__name__)
+
+RESCORE_COLUMNS = 'id, chat_id, user_id, activity_type, points, timestamp, post_id, post_timestamp'
+PAGE_SIZE = 1000
+CHUNK_SIZE = 5000
+UPDATE_BATCH_SIZE = 500
+
+# Activity types whose points depend on the post age
+AGED_TYPES = ('comment', 'reaction')
+
+
+def stream_rows(table: str, seasons=None, page_size: int = PAGE_SIZE):
+    """Yield rows of a table in id order, one page at a time"""
+    columns = RESCORE_COLUMNS + (', season_id' if table == 'activity_log_archive' else '')
+    in_ = {'season_id': seasons} if seasons and seasons != 'all' else None
+    for page in iter_pages(table, columns, page_size, in_=in_):
+        yield from page
+
+
+def _score_chunk(rules: dict, events: list) -> list:
+    """Score (activity_type, age_seconds, position) tuples in a worker process"""
+    compiled = ScoringRules(rules)
+    return compiled.points_many(*zip(*events)) if events else []
+
+
+def _batches(table: str, seasons=None, batch_size: int = CHUNK_SIZE):
+    """Stream a table and yield (rows, events) scoring inputs, batch_size rows at a time.
+
+    Only the comment counters (to number comments per post) outlive a batch.
+    """
+    rows = []
+    events = []
+    comment_counts = {}
+    streamed = 0
+
+    for row in stream_rows(table, seasons):
+        activity_type = row['activity_type']
+        season = row.get('season_id')
+        chat_id = row.get('chat_id') or GROUP_CHAT_ID
+        post_id = row.get('post_id')
+
+        position = None
+        if activity_type == 'comment':
+            # Comments are numbered per post in each chat, and per season for archived rows
+            key = (season, chat_id, post_id)
+            position = comment_counts[key] = comment_counts.get(key, 0) + 1
+
+        age_seconds = 0
+        if activity_type in AGED_TYPES and row.get('post_timestamp'):
+            age_seconds = parse_timestamp(row['timestamp']) - parse_timestamp(row['post_timestamp'])
+
+        rows.append((table, row['id'], row['user_id'], row['points'], chat_id))
+        events.append((activity_type, age_seconds, position))
+        if len(rows) >= batch_size:
+            streamed += len(rows)
+            yield rows, events
+            rows, events = [], []
+
+    if rows:
+        streamed += len(rows)
+        yield rows, events
+    logger.info(f"📥 Streamed {streamed} rows from {table}")
+
+
+def _leaderboard_diff(old_totals: dict, new_totals: dict, limit: int) -> list:
+    """Rank changes between the old and new per-user totals"""
+    old_rank = {user_id: idx + 1 for idx, user_id in enumerate(sorted(old_totals, key=old_totals.get, reverse=True))}
+    new_order = sorted(new_totals, key=new_totals.get, reverse=True)
+
+    diff = []
+    for idx, user_id in enumerate(new_order[:limit]):
+        diff.append({
+            'user_id': user_id,
+            'old_rank': old_rank[user_id],
+            'new_rank': idx + 1,
+            'old_score': old_totals[user_id],
+            'new_score': new_totals[user_id],
+        })
+    return diff
+
+
+def _write_back(changes: list):
+    """Apply point changes, one UPDATE per (table, points value) batch"""
+    groups = {}
+    for table, row_id, new in changes:
+        groups.setdefault((table, new), []).append(row_id)
+
+    written = 0
+    for (table, points), ids in groups.items():
+        for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+            batch = ids[start:start + UPDATE_BATCH_SIZE]
+            supabase.table(table).update({'points': points}).in_('id', batch).execute()
+            written += len(batch)
+        logger.info(f"💾 Set {len(ids)} rows in {table} to {points} points")
+    return written
+
+
+def rescore(seasons=None, dry_run: bool = True, workers: int = None, rules: ScoringRules = scoring_rules, top: int = 10,
+            chat_id: int = GROUP_CHAT_ID) -> dict:
+    """Recompute points for the whole history under the current scoring rules.
+
+    seasons selects archived seasons to include ('all' or a list of
+    season_id values). Rows of every chat are streamed, scored and, unless
+    dry_run is set, written back one batch at a time; only the comment
+    counters, the running per-user totals of chat_id's current season (for
+    the leaderboard diff) and the ids of changed current rows are kept.
+    workers=0 scores in the calling thread (the bot does this), otherwise a
+    process pool of that many workers scores each batch in parallel chunks
+    (None = one per CPU, the CLI default).
+    """
+    logger.info(f"🔁 Rescoring history (seasons={seasons}, dry_run={dry_run})")
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+    batch_size = CHUNK_SIZE * max(workers, 1)
+    tables = [('activity_log', None)] + ([('activity_log_archive', seasons)] if seasons else [])
+
+    report = {'rows': 0, 'changed': 0, 'points_before': 0, 'points_after': 0, 'applied': False}
+    current_changes = {}
+    old_totals = {}
+    new_totals = {}
+    try:
+        for table, table_seasons in tables:
+            for rows, events in _batches(table, table_seasons, batch_size):
+                if pool:
+                    chunks = [events[start:start + CHUNK_SIZE] for start in range(0, len(events), CHUNK_SIZE)]
+                    scored = pool.map(_score_chunk, [rules.rules] * len(chunks), chunks)
+                    new_points = [points for chunk in scored for points in chunk]
+                else:
+                    new_points = _score_chunk(rules.rules, events)
+
+                changes = []
+                for (row_table, row_id, user_id, old, row_chat_id), new in zip(rows, new_points):
+                    report['points_before'] += old
+                    report['points_after'] += new
+                    if new != old:
+                        changes.append((row_table, row_id, new))
+                    if row_table == 'activity_log' and row_chat_id == chat_id:
+                        old_totals[user_id] = old_totals.get(user_id, 0) + old
+                        new_totals[user_id] = new_totals.get(user_id, 0) + new
+                report['rows'] += len(rows)
+                report['changed'] += len(changes)
+
+                if changes and not dry_run:
+                    _write_back(changes)
+                    current_changes.update((row_id, new) for row_table, row_id, new in changes if row_table == 'activity_log')
+    finally:
+        if pool:
+            pool.shutdown()
+
+    report['leaderboard'] = _leaderboard_diff(old_totals, new_totals, top)
+    logger.info(f"📊 {report['changed']}/{report['rows']} rows change, total {report['points_before']} -> {report['points_after']} points")
+
+    if report['changed'] and not dry_run:
+        report['applied'] = True
+        report['current_changes'] = current_changes
+
+    return report
+
+
+def format_report(report: dict) -> str:
+    """Plain-text summary of a rescoring report"""
+    lines = [
+        f"Rows scanned: {report['rows']}",
+        f"Rows changed: {report['changed']}",
+        f"Total points: {report['points_before']} -> {report['points_after']}",
+        "Applied" if report['applied'] else "Dry run, nothing written",
+        "",
+        "Current season top after rescoring:",
+    ]
+    for entry in report['leaderboard']:
+        move = entry['old_rank'] - entry['new_rank']
+        arrow = f"+{move}" if move > 0 else (str(move) if move < 0 else "=")
+        lines.append(f"{entry['new_rank']}. {entry['user_id']}: {entry['old_score']} -> {entry['new_score']} ({arrow})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescore activity history under the current scoring rules")
+    parser.add_argument('--apply', action='store_true', help="write changed points back (default is a dry run)")
+    parser.add_argument('--season', action='append', dest='seasons', help="archived season (season_id) to include, or 'all'")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes for scoring (0 = score in this process)")
+    parser.add_argument('--chat', type=int, default=GROUP_CHAT_ID, help="chat whose leaderboard diff is reported")
+    args = parser.parse_args()
+
+    seasons = 'all' if args.seasons and 'all' in args.seasons else args.seasons
+    report = rescore(seasons=seasons, dry_run=not args.apply, workers=args.workers, chat_id=args.chat)
+    if report['applied'] and os.path.exists(SNAPSHOT_PATH):
+        # The warm-restart snapshot still holds the old points
+        os.remove(SNAPSHOT_PATH)
+        logger.warning(f"🗑️  Removed {SNAPSHOT_PATH}, restart a running bot so it reloads the rescored points")
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    main()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+from bisect import bisect_right
+
+import numpy as np
+
+from config import SCORING_RULES, SCORING_RULES_FILE
+
+logger = logging.getLogger(__name__)
+
+ORDINALS = {1: '1st', 2: '2nd', 3: '3rd'}
+
+
+def load_rules(path: str = SCORING_RULES_FILE) -> dict:
+    """Return SCORING_RULES with any per-type overrides from a JSON rules file"""
+    rules = dict(SCORING_RULES)
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                overrides = json.load(f)
+            rules.update(overrides)
+            logger.info(f"📜 Loaded scoring rules for {sorted(overrides)} from {path}")
+        except Exception as e:
+            logger.error(f"❌ Error reading scoring rules from {path}, using defaults: {e}")
+    return rules
+
+
+class ScoringRules:
+    """Scoring rules compiled into per-type lookup tables.
+
+    Each activity type maps to a sorted list of age boundaries (seconds) and
+    one tier per boundary, plus an open-ended last tier. A tier is a tuple of
+    points by comment position and a default. Scoring an event is a dict hit,
+    a binary search over a handful of boundaries and a tuple index.
+    """
+
+    def __init__(self, rules: dict):
+        self.rules = rules
+        self._table = {}
+        self._matrices = {}
+        for activity_type, tiers in rules.items():
+            bounds = []
+            compiled = []
+            for tier in tiers:
+                max_age_hours = tier.get('max_age_hours')
+                compiled.append((tuple(tier.get('positions', ())), tier.get('points', 0)))
+                if max_age_hours is None:
+                    break
+                bounds.append(max_age_hours * 3600)
+            else:
+                # No open-ended tier: anything older than the last boundary earns nothing
+                compiled.append(((), 0))
+            self._table[activity_type] = (bounds, compiled)
+            # Same tiers as a (tier, position) matrix for points_many: column 0 and positions past a
+            # tier's list hold its default
+            width = 1 + max(len(positions) for positions, _ in compiled)
+            matrix = np.array([(default, *positions) + (default,) * (width - 1 - len(positions))
+                               for positions, default in compiled], dtype=np.int64)
+            self._matrices[activity_type] = (np.array(bounds, dtype=np.float64), matrix)
+
+    def fingerprint(self) -> str:
+        """Short hash of the rules, stamped on snapshots scored under them"""
+        return hashlib.sha256(json.dumps(self.rules, sort_keys=True).encode()).hexdigest()[:16]
+
+    def points(self, activity_type: str, age_seconds: float = 0, position: int = None) -> int:
+        """Points for one event given the post age and the comment position"""
+        entry = self._table.get(activity_type)
+        if entry is None:
+            logger.warning(f"⚠️  Unknown activity type: {activity_type}, returning 0 points")
+            return 0
+        bounds, tiers = entry
+        positions, default = tiers[bisect_right(bounds, age_seconds)]
+        if position and position <= len(positions):
+            return positions[position - 1]
+        return default
+
+    def points_many(self, activity_types, ages, positions) -> list:
+        """points() over parallel sequences, as one numpy lookup per activity type"""
+        types = np.asarray(activity_types)
+        ages = np.asarray(ages, dtype=np.float64)
+        positions = np.fromiter((position or 0 for position in positions), dtype=np.int64, count=len(ages))
+        result = np.zeros(len(ages), dtype=np.int64)
+        for activity_type in np.unique(types).tolist():
+            entry = self._matrices.get(activity_type)
+            if entry is None:
+                logger.warning(f"⚠️  Unknown activity type: {activity_type}, returning 0 points")
+                continue
+            bounds, matrix = entry
+            selected = types == activity_type
+            tiers = np.searchsorted(bounds, ages[selected], side='right')
+            columns = positions[selected]
+            columns[columns >= matrix.shape[1]] = 0
+            result[selected] = matrix[tiers, columns]
+        return result.tolist()
+
+    def summary(self, activity_type: str) -> str:
+        """Short "10/3" style summary of the distinct values for a type"""
+        values = []
+        for positions, default in self._table.get(activity_type, ([], []))[1]:
+            for value in (*positions, default):
+                if value not in values:
+                    values.append(value)
+        return '/'.join(str(value) for value in values)
+
+    def describe(self, activity_type: str) -> list:
+        """Human readable lines ("First 48h: 3 points") for a type"""
+        bounds, tiers = self._table.get(activity_type, ([], []))
+        lines = []
+        for idx, (positions, default) in enumerate(tiers):
+            if not bounds:
+                prefix = ''
+            elif idx == 0:
+                prefix = f"First {bounds[0] / 3600:g}h"
+            elif idx < len(bounds):
+                prefix = f"{bounds[idx - 1] / 3600:g}h-{bounds[idx] / 3600:g}h"
+            else:
+                prefix = f"After {bounds[-1] / 3600:g}h"
+
+            for position, value in enumerate(positions, start=1):
+                ordinal = ORDINALS.get(position, f'{position}th')
+                lines.append(f"{prefix} {ordinal} comment: {value} points".strip())
+
+            if positions:
+                label = f"{prefix} other comments" if prefix else "All other comments"
+            else:
+                label = prefix or "Per event"
+            lines.append(f"{label}: {default} points")
+        return lines
+
+
+scoring_rules = ScoringRules(load_rules())
@@ -0,0 +1,223 @@
+import heapq
+import logging
+from datetime import datetime, timezone
+
+from config import supabase
+from utils.helpers import iter_pages
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE = 'activity_log_archive'
+SEASONS_TABLE = 'seasons'
+USER_SUMMARY_TABLE = 'season_user_summary'
+POST_SUMMARY_TABLE = 'season_post_summary'
+PAGE_SIZE = 1000
+INSERT_BATCH_SIZE = 500
+
+# Schema expected in the database. The archive is list-partitioned by season_id, with one
+# partition per season (seasons created before this change are backfilled with
+# season_id = archive_timestamp). The summaries are compact and small enough to scan whole.
+#
+#   activity_log_archive (..., archive_timestamp text, season_id text) PARTITION BY LIST (season_id)
+#   seasons (id, season_id, chat_id, status, last_id, started_at, ended_at, rows, users, posts, total_points)
+#   season_user_summary (id, season_id, chat_id, user_id, username, first_name, points,
+#                        comments, reactions, referrals, rank)
+#   season_post_summary (id, season_id, chat_id, post_id, comments, reactions, unique_users, points)
+#
+# PostgREST cannot run DDL, so the partition of a new season is created by this function:
+#
+#   create function create_season_partition(season_id text) returns void
+#   language plpgsql security definer as $$
+#   begin
+#     execute format(
+#       'create table if not exists %I partition of activity_log_archive for values in (%L)',
+#       'activity_log_archive_' || regexp_replace(season_id, '[^0-9a-zA-Z]', '_', 'g'), season_id);
+#   end $$;
+#
+# A season moves through status 'archiving' (rows being copied) -> 'copied' (copy and
+# summaries complete) -> 'done' (season rows removed from activity_log). Its last_id is fixed
+# when it is created, so a retry after a failure resumes the same season over the same rows.
+
+
+def new_season_id() -> str:
+    """Identifier of a season archived now (same format as the old archive_timestamp)"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d_%H-%M-%S")
+
+
+def _insert_batches(table: str, rows: list):
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        supabase.table(table).insert(rows[start:start + INSERT_BATCH_SIZE]).execute()
+
+
+def _summarize(season_id: str, chat_id: int, users: dict, posts: dict) -> tuple:
+    """Turn the per-user and per-post aggregates into summary rows, users ranked by points"""
+    ranked = sorted(users.items(), key=lambda item: item[1]['points'], reverse=True)
+    user_rows = [
+        {'season_id': season_id, 'chat_id': chat_id, 'user_id': user_id, 'rank': rank, **totals}
+        for rank, (user_id, totals) in enumerate(ranked, start=1)
+    ]
+    post_rows = [
+        {'season_id': season_id, 'chat_id': chat_id, 'post_id': post_id,
+         'comments': totals['comments'], 'reactions': totals['reactions'],
+         'unique_users': len(totals['users']), 'points': totals['points']}
+        for post_id, totals in posts.items()
+    ]
+    return user_rows, post_rows
+
+
+def _open_season(chat_id: int) -> dict:
+    """The chat's unfinished season, or a new one covering activity_log up to its current last id"""
+    result = supabase.table(SEASONS_TABLE).select('*').eq('chat_id', chat_id).in_('status', ['archiving', 'copied']).limit(1).execute()
+    if result.data:
+        season = result.data[0]
+        logger.info(f"↩️ Resuming season {season['season_id']} of chat {chat_id} ({season['status']})")
+        return season
+
+    result = supabase.table('activity_log').select('id').eq('chat_id', chat_id).order('id', desc=True).limit(1).execute()
+    if not result.data:
+        return None
+    season = {'season_id': new_season_id(), 'chat_id': chat_id, 'status': 'archiving', 'last_id': result.data[0]['id']}
+    supabase.table(SEASONS_TABLE).insert(season).execute()
+    logger.info(f"📦 Archiving chat {chat_id} into season {season['season_id']} (up to id {season['last_id']})")
+    return season
+
+
+def _copy_season(season: dict, page_size: int) -> dict:
+    """Copy the season's rows into its archive partition and write its summaries; returns the totals"""
+    season_id = season['season_id']
+    chat_id = season['chat_id']
+    last_id = season['last_id']
+
+    supabase.rpc('create_season_partition', {'season_id': season_id}).execute()
+    # Whatever a failed attempt left behind is redone from scratch (chats can share a season_id)
+    supabase.table(ARCHIVE_TABLE).delete().eq('season_id', season_id).eq('chat_id', chat_id).execute()
+    supabase.table(USER_SUMMARY_TABLE).delete().eq('season_id', season_id).eq('chat_id', chat_id).execute()
+    supabase.table(POST_SUMMARY_TABLE).delete().eq('season_id', season_id).eq('chat_id', chat_id).execute()
+
+    users = {}
+    posts = {}
+    archived = 0
+    started_at = ended_at = None
+    total_points = 0
+
+    for page in iter_pages('activity_log', '*', page_size, eq={'chat_id': chat_id}):
+        page = [row for row in page if row['id'] <= last_id]
+        if not page:
+            break
+        for row in page:
+            row['archive_timestamp'] = season_id
+            row['season_id'] = season_id
+
+            user_id = row['user_id']
+            activity_type = row['activity_type']
+            points = row.get('points') or 0
+            total_points += points
+
+            totals = users.get(user_id)
+            if totals is None:
+                totals = users[user_id] = {'username': None, 'first_name': None, 'points': 0,
+                                           'comments': 0, 'reactions': 0, 'referrals': 0}
+            totals['points'] += points
+            totals['username'] = row.get('username') or totals['username']
+            totals['first_name'] = row.get('first_name') or totals['first_name']
+            if activity_type == 'comment':
+                totals['comments'] += 1
+            elif activity_type == 'reaction':
+                totals['reactions'] += 1
+            elif activity_type == 'referral':
+                totals['referrals'] += 1
+
+            # Referral rows reuse post_id for the referred user
+            post_id = row.get('post_id')
+            if post_id and activity_type in ('comment', 'reaction'):
+                post = posts.get(post_id)
+                if post is None:
+                    post = posts[post_id] = {'comments': 0, 'reactions': 0, 'users': set(), 'points': 0}
+                post['comments' if activity_type == 'comment' else 'reactions'] += 1
+                post['users'].add(user_id)
+                post['points'] += points
+
+            timestamp = row.get('timestamp')
+            if timestamp:
+                started_at = min(started_at, timestamp) if started_at else timestamp
+                ended_at = max(ended_at, timestamp) if ended_at else timestamp
+
+        supabase.table(ARCHIVE_TABLE).insert(page).execute()
+        archived += len(page)
+        logger.info(f"📤 Archived {archived} records")
+
+    user_rows, post_rows = _summarize(season_id, chat_id, users, posts)
+    _insert_batches(USER_SUMMARY_TABLE, user_rows)
+    _insert_batches(POST_SUMMARY_TABLE, post_rows)
+    logger.info(f"🧾 Season {season_id} summarized: {len(user_rows)} users, {len(post_rows)} posts")
+    return {
+        'started_at': started_at,
+        'ended_at': ended_at,
+        'rows': archived,
+        'users': len(user_rows),
+        'posts': len(post_rows),
+        'total_points': total_points,
+    }
+
+
+def archive_season(chat_id: int, page_size: int = PAGE_SIZE) -> dict:
+    """Move a chat's activity_log into its own archive season and write its summaries.
+
+    Rows are streamed page by page and copied with one bulk insert per page,
+    while per-user and per-post totals are folded in, so memory is bounded
+    by the number of users and posts, not rows. Only rows up to the season's
+    last_id are archived and deleted; activity that arrives meanwhile stays
+    in the new season. Blocking: run it off the event loop. Safe to call
+    again after a failure, it resumes the unfinished season. Returns the
+    season row, or None if there was nothing to archive.
+    """
+    season = _open_season(chat_id)
+    if season is None:
+        logger.info(f"⚠️  No records found to archive")
+        return None
+
+    if season['status'] == 'archiving':
+        season.update(_copy_season(season, page_size), status='copied')
+        supabase.table(SEASONS_TABLE).update({k: v for k, v in season.items() if k != 'id'}).eq('season_id', season['season_id']).eq('chat_id', chat_id).execute()
+
+    supabase.table('activity_log').delete().eq('chat_id', chat_id).lte('id', season['last_id']).execute()
+    logger.info(f"✅ Main table cleared up to id {season['last_id']}")
+    season['status'] = 'done'
+    supabase.table(SEASONS_TABLE).update({'status': 'done'}).eq('season_id', season['season_id']).eq('chat_id', chat_id).execute()
+    return season
+
+
+def list_seasons(chat_id: int) -> list:
+    """Archived seasons of a chat, oldest first (seasons still being archived are left out)"""
+    seasons = [row for page in iter_pages(SEASONS_TABLE, '*', PAGE_SIZE, eq={'chat_id': chat_id}) for row in page
+               if row.get('status') in (None, 'done')]
+    return sorted(seasons, key=lambda season: season['season_id'])
+
+
+def hall_of_fame(chat_id: int, limit: int = 10) -> dict:
+    """All-seasons standings of a chat, read from the per-user season summaries only.
+
+    Returns {'leaders': [...], 'champions': [...]}: users ranked by points
+    over every archived season (with seasons played and seasons won), and
+    the winner of each season.
+    """
+    users = {}
+    champions = []
+    for page in iter_pages(USER_SUMMARY_TABLE, 'id, season_id, user_id, username, first_name, points, rank',
+                           PAGE_SIZE, eq={'chat_id': chat_id}):
+        for row in page:
+            entry = users.get(row['user_id'])
+            if entry is None:
+                entry = users[row['user_id']] = {'user_id': row['user_id'], 'username': None, 'first_name': None,
+                                                 'total_score': 0, 'seasons': 0, 'wins': 0}
+            entry['total_score'] += row['points']
+            entry['seasons'] += 1
+            entry['username'] = row.get('username') or entry['username']
+            entry['first_name'] = row.get('first_name') or entry['first_name']
+            if row['rank'] == 1:
+                entry['wins'] += 1
+                champions.append(row)
+
+    leaders = heapq.nlargest(limit, users.values(), key=lambda entry: entry['total_score'])
+    champions.sort(key=lambda row: row['season_id'])
+    return {'leaders': leaders, 'champions': champions}
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import struct
+from array import array
+
+from utils.event_store import ACTIVITY_TYPES, EventStore, activity_type_code
+from utils.scoring import scoring_rules
+from utils.workers import worker_pool
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b'ADSNAP2\n'
+
+# Column attributes of EventStore, written in this order after the header
+SNAPSHOT_COLUMNS = ('ids', 'user_ids', 'types', 'points', 'timestamps', 'post_ids', 'post_timestamps')
+
+
+def save_snapshot(stores: dict, path: str) -> bool:
+    """Checkpoint every event store partition to a compact binary file.
+
+    Layout: magic, 4-byte header length, JSON header (id to resume loading
+    after, type names, scoring rules fingerprint and, per chat, row count and
+    profiles), then each partition's raw column bytes in header order. The file is written next to the target and
+    renamed, so a crash never leaves a torn snapshot behind.
+    """
+    partitions = [(chat_id, store) for chat_id, store in stores.items() if store.loaded]
+    if not partitions:
+        logger.info(f"⏭️  Event stores not loaded yet, skipping snapshot")
+        return False
+
+    header = json.dumps({
+        # Worker rows can be applied out of id order: resume below any row still in flight
+        'last_id': worker_pool.replay_cursor(max(store.last_id for _, store in partitions)),
+        'types': list(ACTIVITY_TYPES),
+        'rules': scoring_rules.fingerprint(),
+        'partitions': [
+            {
+                'chat_id': chat_id,
+                'rows': len(store),
+                'profiles': [[user_id, username, first_name] for user_id, (username, first_name) in store.profiles.items()],
+            }
+            for chat_id, store in partitions
+        ],
+    }).encode('utf-8')
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            for _, store in partitions:
+                for name in SNAPSHOT_COLUMNS:
+                    getattr(store, name).tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        logger.info(f"💾 Snapshot saved to {path}: {sum(len(store) for _, store in partitions)} rows in {len(partitions)} chat(s)")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error saving snapshot: {e}")
+        return False
+
+
+def load_snapshot(stores: dict, path: str, pending_tokens: set = None) -> bool:
+    """Load a snapshot written by save_snapshot into empty partitions.
+
+    Every partition's last_id is set to the snapshot's global last id, so the
+    database replay that follows starts right after the checkpoint; rows the
+    snapshot already holds above it are skipped by that replay. A
+    snapshot scored under other rules is ignored (the stored points were
+    rescored since), so the stores load cold from the database.
+
+    pending_tokens are the provisional ids still in the spool; a spooled row
+    whose record is gone was replayed after the checkpoint and is loaded
+    again under its real id, so its provisional copy is dropped.
+    """
+    if not os.path.exists(path):
+        logger.info(f"📭 No snapshot at {path}, starting cold")
+        return False
+
+    try:
+        loaded = {}
+        with open(path, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                logger.warning(f"⚠️  {path} is not a snapshot file, ignoring it")
+                return False
+            (header_len,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+            if header.get('rules') != scoring_rules.fingerprint():
+                logger.warning(f"⚠️  {path} was scored under other scoring rules, starting cold")
+                return False
+
+            # Type codes are process-local, translate them if the order differs
+            codes = [activity_type_code(name) for name in header['types']]
+
+            for partition in header['partitions']:
+                store = EventStore()
+                for name in SNAPSHOT_COLUMNS:
+                    column = array(getattr(store, name).typecode)
+                    column.fromfile(f, partition['rows'])
+                    setattr(store, name, column)
+                if codes != list(range(len(codes))):
+                    store.types = array('B', (codes[code] for code in store.types))
+                store.profiles = {user_id: (username, first_name) for user_id, username, first_name in partition['profiles']}
+                store.last_id = header['last_id']
+                store.held_ids = {row_id for row_id in store.ids if row_id > store.last_id}
+                store.reindex()
+                if pending_tokens is not None:
+                    dropped = store.drop_provisional(pending_tokens)
+                    if dropped:
+                        logger.info(f"♻️  Dropped {dropped} spooled rows of chat {partition['chat_id']} replayed since the snapshot")
+                loaded[partition['chat_id']] = store
+
+        stores.update(loaded)
+        logger.info(f"⚡ Snapshot loaded from {path}: {len(loaded)} chat(s) up to id {header['last_id']}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error loading snapshot, starting cold: {e}")
+        return False
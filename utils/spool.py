@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+from config import (
+    supabase,
+    SPOOL_PATH,
+    SPOOL_FSYNC_BATCH,
+    SPOOL_FSYNC_SECONDS,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+REPLAY_BATCH_SIZE = 500
+
+
+class CircuitBreaker:
+    """Stops calling a failing backend for a while instead of waiting on every request.
+
+    closed: calls go through. After failure_threshold consecutive failures it
+    opens and calls are skipped; after reset_seconds one probe call is let
+    through (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self) -> bool:
+        return self.state == 'closed'
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+                logger.info(f"🟡 Storage circuit half-open, probing backend")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info(f"🟢 Storage circuit closed, backend recovered")
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"🔴 Storage circuit open after {self.failures} failure(s), spooling writes locally")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class Journal:
+    """Append-only JSON-lines journal of writes that could not reach the backend.
+
+    Every record is flushed to the OS immediately; fsync is batched every
+    fsync_batch records or fsync_seconds, whichever comes first. Replay works
+    on a renamed copy so new records can keep arriving meanwhile.
+    """
+
+    def __init__(self, path: str, fsync_batch: int, fsync_seconds: float):
+        self.path = path
+        self.replay_path = f"{path}.replay"
+        self.fsync_batch = fsync_batch
+        self.fsync_seconds = fsync_seconds
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, table: str, data: dict, token: int = None):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps({'table': table, 'data': data, 'token': token}) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_seconds:
+                self._sync()
+
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """fsync any records still only in the OS cache"""
+        with self._lock:
+            self._sync()
+
+    def pending_tokens(self) -> set:
+        """Provisional ids of the rows still waiting in the journal or its replay copy"""
+        tokens = set()
+        with self._lock:
+            self._sync()
+            for path in (self.path, self.replay_path):
+                if not os.path.exists(path):
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            token = json.loads(line).get('token')
+                        except ValueError:
+                            continue
+                        if token:
+                            tokens.add(token)
+        return tokens
+
+    def pending(self) -> bool:
+        return os.path.exists(self.replay_path) or (os.path.exists(self.path) and os.path.getsize(self.path) > 0)
+
+    def take(self) -> str:
+        """Move the journal aside for replay and return the file to replay (or None)"""
+        with self._lock:
+            if os.path.exists(self.replay_path):
+                return self.replay_path
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                return None
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(self.path, self.replay_path)
+            return self.replay_path
+
+
+class ForwardingJournal:
+    """Journal used inside scoring workers: records are sent to the ingest process.
+
+    Only the ingest process writes (and renames, and replays) the spool
+    file, so no other process ever holds it open.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def append(self, table: str, data: dict, token: int = None):
+        self.queue.put(('spool', table, data, token))
+
+    def sync(self):
+        pass
+
+
+storage_breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+journal = Journal(SPOOL_PATH, SPOOL_FSYNC_BATCH, SPOOL_FSYNC_SECONDS)
+
+
+def provisional_id() -> int:
+    """Negative stand-in id for a spooled row, replaced by the real id on replay"""
+    return -secrets.randbits(62) - 1
+
+
+def insert_or_spool(table: str, data: dict) -> dict:
+    """Insert a row, or journal it locally when the backend is failing.
+
+    Returns the inserted row. A spooled row is returned with a provisional
+    negative id, which replay hands back together with the real id.
+    """
+    if storage_breaker.allow():
+        try:
+            result = supabase.table(table).insert(data).execute()
+            storage_breaker.record_success()
+            return result.data[0] if result.data else data
+        except Exception as e:
+            # Includes the client's per-call timeout, so a backend that hangs opens the breaker too
+            storage_breaker.record_failure()
+            logger.error(f"❌ Insert into {table} failed, spooling locally: {str(e) or type(e).__name__}")
+    token = provisional_id()
+    journal.append(table, data, token)
+    logger.info(f"📼 Spooled {table} row for later replay")
+    return {**data, 'id': token}
+
+
+def replay_spool(on_inserted=None) -> int:
+    """Replay journaled rows in bulk once the backend accepts writes again.
+
+    on_inserted(table, rows, tokens) is called with the rows returned by each
+    bulk insert and the provisional ids they were spooled under, in the same
+    order. Rows that could not be replayed stay in the replay file.
+    """
+    path = journal.take()
+    if not path or not storage_breaker.allow():
+        return 0
+
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    replayed = 0
+    try:
+        while replayed < len(records):
+            table = records[replayed]['table']
+            batch = []
+            tokens = []
+            for record in records[replayed:replayed + REPLAY_BATCH_SIZE]:
+                if record['table'] != table:
+                    break
+                batch.append(record['data'])
+                tokens.append(record.get('token'))
+
+            result = supabase.table(table).insert(batch).execute()
+            storage_breaker.record_success()
+            replayed += len(batch)
+            if on_inserted:
+                on_inserted(table, result.data or [], tokens)
+            logger.info(f"📤 Replayed {len(batch)} spooled {table} rows ({replayed}/{len(records)})")
+    except Exception as e:
+        storage_breaker.record_failure()
+        logger.error(f"❌ Spool replay stopped after {replayed}/{len(records)} rows: {e}")
+
+    remaining = records[replayed:]
+    if remaining:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(record) + "\n" for record in remaining)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    else:
+        os.remove(path)
+    return replayed
@@ -0,0 +1,73 @@
+import logging
+import time
+from collections import Counter
+
+from config import AWARD_RATE_PER_MINUTE, AWARD_BURST, AWARD_POST_CAP, AWARD_IDLE_SECONDS
+from utils.expiring import ExpiringMap
+
+logger = logging.getLogger(__name__)
+
+# Posts remembered per user for the per-post cap, so a user's state stays a fixed size
+TRACKED_POSTS_PER_USER = 8
+
+
+class _UserState:
+    __slots__ = ('tokens', 'updated', 'posts')
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.posts = {}
+
+
+class AwardThrottle:
+    """Per-user token bucket and per-post award cap, checked before any storage call.
+
+    Each (chat, user) gets a bucket of burst tokens refilled at
+    rate_per_minute; an award costs one token. On top of that a user earns at
+    most post_cap awards per post. State is a few fields per active user in
+    an ExpiringMap refreshed on every event, so idle users expire.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, post_cap: int, idle_seconds: int):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.post_cap = post_cap
+        self.users = ExpiringMap(idle_seconds, clock=time.monotonic)
+        self.dropped = Counter()
+
+    def __len__(self):
+        return len(self.users)
+
+    def allow(self, chat_id: int, user_id: int, post_id: int, kind: str) -> bool:
+        """Whether this event may be scored; consumes a token when it may"""
+        now = time.monotonic()
+
+        key = (chat_id, user_id)
+        state = self.users.get(key)
+        if state is None:
+            state = _UserState(self.burst, now)
+        else:
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+            state.updated = now
+        self.users.set(key, state, now=now)
+
+        awards = state.posts.get(post_id, 0)
+        if self.post_cap and awards >= self.post_cap:
+            self.dropped[f"{kind}:post_cap"] += 1
+            logger.info(f"🧯 User {user_id} reached the award cap on post {post_id}, {kind} dropped")
+            return False
+        if state.tokens < 1:
+            self.dropped[f"{kind}:rate"] += 1
+            logger.info(f"🧯 User {user_id} is over the award rate, {kind} dropped")
+            return False
+
+        state.tokens -= 1
+        state.posts.pop(post_id, None)
+        state.posts[post_id] = awards + 1
+        if len(state.posts) > TRACKED_POSTS_PER_USER:
+            del state.posts[next(iter(state.posts))]
+        return True
+
+
+award_throttle = AwardThrottle(AWARD_RATE_PER_MINUTE, AWARD_BURST, AWARD_POST_CAP, AWARD_IDLE_SECONDS)
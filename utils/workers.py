@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+
+from config import WORKER_PROCESSES
+
+logger = logging.getLogger(__name__)
+
+
+def partition_for(chat_id: int, post_id: int, count: int) -> int:
+    """Worker index owning a post. Int tuple hashes are stable across processes."""
+    return hash((chat_id, post_id or 0)) % count
+
+
+def _worker_main(index: int, count: int, inbox, results):
+    """Worker process loop: own the caches of one post partition and score its events in order"""
+    logging.basicConfig(format=f'%(asctime)s - worker{index} - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    from handlers.messages import score_comment
+    from handlers.reactions import score_reaction
+    from utils.helpers import load_event_store
+    from utils.event_store import event_stores, get_event_store
+    from utils import spool
+
+    # Rows this worker cannot store are journaled by the ingest process
+    spool.journal = spool.ForwardingJournal(results)
+    scorers = {'comment': score_comment, 'reaction': score_reaction}
+
+    def update_points(message):
+        for store in event_stores.values():
+            store.update_points(message['changes'])
+
+    # Control messages keep the worker's partition in step with the ingest process's stores
+    controls = {
+        'drop_through': lambda message: get_event_store(message['chat_id']).drop_through(message['last_id']),
+        'resolve_ids': lambda message: get_event_store(message['chat_id']).resolve_ids(message['ids']),
+        'update_points': update_points,
+    }
+
+    load_event_store(partition=(index, count))
+    logger.info(f"👷 Worker {index}/{count} ready")
+
+    while True:
+        event = inbox.get()
+        if event is None:
+            break
+        try:
+            if event['kind'] in controls:
+                controls[event['kind']](event)
+                continue
+            row = scorers[event['kind']](event)
+        except Exception as e:
+            logger.error(f"❌ Worker {index} failed to process {event.get('kind')} event: {e}")
+            row = None
+        # Every scoring event is acknowledged, with its row if one was stored
+        results.put(('done', index, event['chat_id'], row))
+
+    logger.info(f"👋 Worker {index} stopped")
+
+
+class WorkerPool:
+    """Routes scoring events to worker processes partitioned by post.
+
+    Every event for a given (chat_id, post_id) lands on the same worker
+    through its own FIFO queue, so comment positions are assigned in arrival
+    order while different posts are scored on different cores. Inserted rows
+    are sent back so the ingest process keeps its leaderboard stores current.
+
+    Rows come back out of id order, so the highest applied id is not a safe
+    replay cursor. For every event in flight the pool remembers the highest
+    applied id at dispatch time; the row it produces can only get a larger
+    id, so replay_cursor() never skips a row that has not been applied yet.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self.inboxes = []
+        self.processes = []
+        self.results = None
+        # Per worker, the applied id watermark at dispatch of each event still in flight
+        self.in_flight = []
+        self._drain_task = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self.processes)
+
+    def start(self):
+        """Spawn the worker processes (no-op when count is 0)"""
+        if self.count <= 0 or self.running:
+            return
+        ctx = multiprocessing.get_context('spawn')
+        self.results = ctx.Queue()
+        for index in range(self.count):
+            inbox = ctx.Queue()
+            process = ctx.Process(target=_worker_main, args=(index, self.count, inbox, self.results), daemon=True)
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+            self.in_flight.append(deque())
+        self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+        logger.info(f"🚀 Started {self.count} scoring worker processes")
+
+    def dispatch(self, event: dict):
+        """Queue an event on the worker owning its post"""
+        from utils.event_store import stores_last_id
+
+        index = partition_for(event['chat_id'], event['post_id'], self.count)
+        self.in_flight[index].append(stores_last_id())
+        self.inboxes[index].put(event)
+
+    def replay_cursor(self, last_id: int) -> int:
+        """Highest id below which every row has been applied, given the highest applied id"""
+        return min([last_id, *(pending[0] for pending in self.in_flight if pending)])
+
+    def broadcast(self, message: dict):
+        """Queue a control message on every worker, behind the events already queued"""
+        for inbox in self.inboxes:
+            inbox.put(message)
+
+    async def _drain(self):
+        """Apply rows inserted by workers to the ingest process's event stores, and journal their spooled rows.
+
+        Rows from different workers arrive interleaved, not in id order; the
+        stores do not depend on it. A worker's spooled rows come before the
+        acknowledgement of their event.
+        """
+        from utils.event_store import get_event_store
+        from utils.spool import journal
+
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await loop.run_in_executor(None, self.results.get)
+            if item is None:
+                return
+            if item[0] == 'spool':
+                _, table, data, token = item
+                journal.append(table, data, token)
+                continue
+            _, index, chat_id, row = item
+            if self.in_flight[index]:
+                self.in_flight[index].popleft()
+            store = get_event_store(chat_id)
+            if row and store.loaded:
+                store.append_row(row)
+
+    async def stop(self, timeout: float = 10):
+        """Let workers finish their queues, then apply everything they sent back and stop"""
+        if not self.running:
+            return
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            await asyncio.to_thread(process.join, timeout)
+        # The drain task applies the remaining rows and journals spooled ones up to this marker
+        self.results.put(None)
+        await self._drain_task
+        lost = sum(len(pending) for pending in self.in_flight)
+        if lost:
+            logger.warning(f"⚠️  {lost} scoring events were still unanswered when the workers stopped")
+        self.inboxes = []
+        self.processes = []
+        self.in_flight = []
+        logger.info(f"🛑 Scoring workers stopped")
+
+
+worker_pool = WorkerPool(WORKER_PROCESSES)